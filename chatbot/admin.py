@@ -1,6 +1,7 @@
-import json
+import orjson
 
 from django.contrib import admin
+from django.db.models import Count
 from django.utils.html import format_html
 
 from .models import ChatSession, ChatMessage
@@ -23,14 +24,23 @@ class ChatSessionAdmin(admin.ModelAdmin):
 	readonly_fields = ('user', 'created_at', 'context_display')
 	inlines = [ChatMessageInline]
 
+	def changelist_view(self, request, extra_context=None):
+		request._in_changelist = True
+		return super().changelist_view(request, extra_context)
+
 	def get_queryset(self, request):
-		qs = super().get_queryset(request)
-		return qs.prefetch_related('messages', 'user')
+		qs = super().get_queryset(request).select_related('user')
+		if getattr(request, '_in_changelist', False):
+			# Only the list shows message counts; the change form's inline queries its own rows.
+			qs = qs.annotate(_message_count=Count('messages'))
+		return qs
 
 	def message_count(self, obj):
-		return obj.messages.count()
+		count = getattr(obj, '_message_count', None)
+		return obj.messages.count() if count is None else count
 
 	message_count.short_description = 'Messages'
+	message_count.admin_order_field = '_message_count'
 
 	def context_summary(self, obj):
 		context = obj.context or {}
@@ -46,7 +56,7 @@ class ChatSessionAdmin(admin.ModelAdmin):
 	def context_display(self, obj):
 		if not obj.context:
 			return 'No context recorded'
-		data = json.dumps(obj.context, indent=2, ensure_ascii=False)
+		data = orjson.dumps(obj.context, option=orjson.OPT_INDENT_2).decode()
 		return format_html('<pre style="white-space: pre-wrap;">{}</pre>', data)
 
 	context_display.short_description = 'Context JSON'
@@ -58,6 +68,7 @@ class ChatMessageAdmin(admin.ModelAdmin):
 	list_filter = ('role', 'created_at')
 	search_fields = ('text', 'session__user__username')
 	readonly_fields = ('session', 'role', 'text', 'location', 'feedback', 'created_at')
+	list_select_related = ('session__user',)
 
 	def short_text(self, obj):
 		return (obj.text[:60] + '…') if len(obj.text) > 60 else obj.text
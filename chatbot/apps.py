@@ -1,5 +1,50 @@
+import logging
+import os
+import sys
+import threading
+
 from django.apps import AppConfig
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# WSGI/ASGI servers that serve chat requests, matched against the executable name.
+_SERVER_PROGRAMS = ('gunicorn', 'uvicorn', 'daphne', 'hypercorn', 'uwsgi', 'waitress-serve')
+
+
+def _program_name(argv0: str) -> str:
+    name = os.path.basename(argv0)
+    if name == '__main__.py':
+        # ``python -m gunicorn`` reports the package's __main__ module.
+        name = os.path.basename(os.path.dirname(argv0))
+    return name
+
+
+def _should_warm_embeddings() -> bool:
+    """Warm the embedding model only in processes that will serve chat requests."""
+    if not getattr(settings, 'CHATBOT_WARM_EMBEDDINGS', True) or not sys.argv:
+        return False
+    if _program_name(sys.argv[0]).startswith(_SERVER_PROGRAMS):
+        return True
+    if len(sys.argv) > 1 and sys.argv[1] == 'runserver':
+        # Only the autoreloader's child process serves requests.
+        return os.environ.get('RUN_MAIN') == 'true'
+    # migrate, test, collectstatic, shell, django-admin, pytest, ad-hoc scripts, ...
+    return False
+
+
+def _warm_embeddings():
+    try:
+        from .embedding_filter import _load_model
+
+        _load_model()
+    except Exception:  # pragma: no cover - optional dependency or load failure
+        logger.warning('Embedding model warm-up failed; it will load on first use', exc_info=True)
 
 
 class ChatbotConfig(AppConfig):
     name = 'chatbot'
+
+    def ready(self):
+        if _should_warm_embeddings():
+            threading.Thread(target=_warm_embeddings, name='chatbot-embedding-warmup', daemon=True).start()
@@ -15,8 +15,21 @@ DECOMMISSIONED_MODEL_MAP: Final[dict[str, str]] = {
     "mixtral-8x7b-32768": DEFAULT_GROQ_MODEL,
 }
 
+GREETING_TERMS: Final[tuple[str, ...]] = (
+    "hi",
+    "hello",
+    "hey",
+    "namaste",
+    "namaskar",
+    "vanakkam",
+    r"good\s+(?:morning|evening|afternoon)",
+    "greetings",
+)
+
+# The lookahead on the terms' first letters lets the scan reject most positions without trying
+# every alternative.
 GREETING_PATTERN = re.compile(
-    r"\b(hi|hello|hey|namaste|namaskar|vanakkam|good\s+(morning|evening|afternoon)|greetings)\b",
+    r"\b(?=[" + "".join(sorted({term[0] for term in GREETING_TERMS})) + r"])(?:" + "|".join(GREETING_TERMS) + r")\b",
     re.IGNORECASE,
 )
 
@@ -216,6 +229,7 @@ __all__ = [
     "DEFAULT_GROQ_MODEL",
     "DECOMMISSIONED_MODEL_MAP",
     "GREETING_PATTERN",
+    "GREETING_TERMS",
     "CATTLE_KEYWORDS",
     "BOVINE_CORE_TERMS",
     "CATTLE_KEYWORD_PATTERN",
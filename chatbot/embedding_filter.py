@@ -2,22 +2,45 @@
 from __future__ import annotations
 
 import logging
+import os
+import queue
+import re
+import string
 import threading
+import time
+from functools import lru_cache
 from typing import Any, Sequence, Tuple
 
 import numpy as np
 from django.conf import settings
 
-try:
-    from sentence_transformers import SentenceTransformer, util
-except ImportError as exc:  # pragma: no cover - import guarded for environments without dependency
-    raise RuntimeError("sentence-transformers must be installed to use the embedding filter") from exc
-
 logger = logging.getLogger(__name__)
 
 
 DEFAULT_MODEL_NAME = getattr(settings, "CHATBOT_EMBED_MODEL", "all-MiniLM-L6-v2")
 HF_TOKEN = getattr(settings, "HUGGINGFACE_API_TOKEN", None) or getattr(settings, "SENTENCE_TRANSFORMERS_API_KEY", None)
+# Optional ONNX export of the embedding model; when set, ONNX Runtime replaces PyTorch for encoding.
+ONNX_MODEL_PATH = getattr(settings, "CHATBOT_EMBED_ONNX_PATH", None)
+ONNX_TOKENIZER_NAME = getattr(settings, "CHATBOT_EMBED_TOKENIZER", None) or (
+    DEFAULT_MODEL_NAME if "/" in DEFAULT_MODEL_NAME else f"sentence-transformers/{DEFAULT_MODEL_NAME}"
+)
+ONNX_MAX_SEQ_LENGTH = 128
+# Intra-op threads per process; with N gunicorn workers set CHATBOT_TORCH_THREADS to cpu_count / N.
+TORCH_THREADS = int(getattr(settings, "CHATBOT_TORCH_THREADS", 0) or 0) or max(1, (os.cpu_count() or 2) // 2)
+
+try:
+    import torch
+    from sentence_transformers import SentenceTransformer
+except ImportError as exc:  # pragma: no cover - import guarded for environments without dependency
+    if not ONNX_MODEL_PATH:
+        raise RuntimeError("sentence-transformers must be installed to use the embedding filter") from exc
+    SentenceTransformer = None
+else:
+    torch.set_num_threads(TORCH_THREADS)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:  # pragma: no cover - already set or parallel work has started
+        pass
 
 # Prompts that represent our allowed topic cluster
 CATTLE_TOPIC_PROMPTS: Sequence[str] = (
@@ -34,37 +57,190 @@ CATTLE_TOPIC_PROMPTS: Sequence[str] = (
     "dairy farm management",
 )
 
+# Punctuation/whitespace runs that only add noise to cache keys ("cow mastitis?" vs "cow  mastitis")
+_QUERY_NOISE_RE = re.compile(r"[\s" + re.escape(string.punctuation) + r"]+")
+
+# Concurrent queries are coalesced into one encode call: up to this many per batch ...
+BATCH_MAX_SIZE = 16
+# ... collected for at most this long after the first one arrives.
+BATCH_WAIT_SECONDS = 0.005
+# Length-sorted sub-batch size handed to the encoder, keeping padding waste low.
+ENCODE_BATCH_SIZE = 8
+# Generous enough to cover a cold model load inside the batch worker.
+BATCH_RESULT_TIMEOUT = 60.0
+
 _model = None
 _topic_embeddings = None
 _model_lock = threading.Lock()
 
 
-def _load_model() -> Tuple[SentenceTransformer, Any]:
-    """Lazy-load the sentence transformer and topic embeddings."""
+def _unit_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalise each row so cosine similarity reduces to a dot product."""
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+class _OnnxEncoder:
+    """ONNX Runtime stand-in for ``SentenceTransformer.encode`` with mean pooling over token embeddings."""
+
+    def __init__(self, model_path: str, tokenizer_name: str, token: str | None = None) -> None:
+        try:
+            import onnxruntime as ort
+            from transformers import AutoTokenizer
+        except ImportError as exc:  # pragma: no cover - optional dependency
+            raise RuntimeError("onnxruntime and transformers must be installed to use CHATBOT_EMBED_ONNX_PATH") from exc
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = os.cpu_count() or 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self._session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self._input_names = [model_input.name for model_input in self._session.get_inputs()]
+        self.tokenizer = AutoTokenizer.from_pretrained(tokenizer_name, token=token)
+
+    def encode(
+        self, sentences: str | Sequence[str], batch_size: int = 32, convert_to_numpy: bool = True, **_: Any
+    ) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        encoded = self.tokenizer(texts, truncation=True, max_length=ONNX_MAX_SEQ_LENGTH)
+        # Smart batching: run length-sorted sub-batches so each pads only to its own longest query.
+        order = np.argsort([len(ids) for ids in encoded["input_ids"]], kind="stable")
+        chunks = []
+        for start in range(0, len(texts), batch_size):
+            indices = order[start:start + batch_size]
+            features = self.tokenizer.pad(
+                {key: [encoded[key][i] for i in indices] for key in encoded.keys()},
+                padding=True,
+                return_tensors="np",
+            )
+            chunks.append(self._mean_pool(features))
+        pooled = np.concatenate(chunks)[np.argsort(order)]
+        return pooled[0] if single else pooled
+
+    def _mean_pool(self, features: Any) -> np.ndarray:
+        feeds = {name: features[name].astype(np.int64) for name in self._input_names if name in features}
+        token_embeddings = self._session.run(None, feeds)[0]
+        mask = features["attention_mask"][..., None].astype(np.float32)
+        return (token_embeddings * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+
+
+def _load_model() -> Tuple[Any, np.ndarray]:
+    """Lazy-load the embedding model and the L2-normalised topic embedding matrix."""
     global _model, _topic_embeddings
     if _model is None:
         with _model_lock:
             if _model is None:
-                kwargs = {}
-                if HF_TOKEN:
-                    kwargs["use_auth_token"] = HF_TOKEN
-                logger.info("Loading sentence-transformer model '%s'", DEFAULT_MODEL_NAME)
-                _model = SentenceTransformer(DEFAULT_MODEL_NAME, **kwargs)
+                if ONNX_MODEL_PATH:
+                    logger.info("Loading ONNX embedding model '%s'", ONNX_MODEL_PATH)
+                    _model = _OnnxEncoder(ONNX_MODEL_PATH, ONNX_TOKENIZER_NAME, HF_TOKEN)
+                else:
+                    kwargs = {}
+                    if HF_TOKEN:
+                        kwargs["use_auth_token"] = HF_TOKEN
+                    logger.info("Loading sentence-transformer model '%s'", DEFAULT_MODEL_NAME)
+                    _model = SentenceTransformer(DEFAULT_MODEL_NAME, **kwargs)
+                # Scores cached against a previous model instance are no longer valid.
+                _score_query.cache_clear()
     if _topic_embeddings is None:
         with _model_lock:
             if _topic_embeddings is None:
-                _topic_embeddings = _model.encode(list(CATTLE_TOPIC_PROMPTS), convert_to_tensor=True)
+                embeddings = _model.encode(list(CATTLE_TOPIC_PROMPTS), convert_to_numpy=True)
+                _topic_embeddings = _unit_rows(np.asarray(embeddings, dtype=np.float32))
     return _model, _topic_embeddings
 
 
+class _PendingQuery:
+    """A query waiting for the batch worker, plus the slot its result is written to."""
+
+    __slots__ = ("query", "done", "score", "error")
+
+    def __init__(self, query: str) -> None:
+        self.query = query
+        self.done = threading.Event()
+        self.score = 0.0
+        self.error: Exception | None = None
+
+
+_batch_queue: "queue.Queue[_PendingQuery]" = queue.Queue()
+_batch_worker: threading.Thread | None = None
+_batch_worker_lock = threading.Lock()
+
+
+def _score_batch(queries: Sequence[str]) -> np.ndarray:
+    """Encode queries in a single forward pass and return each one's best topic similarity."""
+    model, topic_emb = _load_model()
+    embeddings = model.encode(list(queries), batch_size=ENCODE_BATCH_SIZE, convert_to_numpy=True)
+    q_emb = _unit_rows(np.asarray(embeddings, dtype=np.float32))
+    return (q_emb @ topic_emb.T).max(axis=1)
+
+
+def _drain_batch() -> list[_PendingQuery]:
+    """Block for one pending query, then gather whatever else arrives within the batch window."""
+    batch = [_batch_queue.get()]
+    deadline = time.monotonic() + BATCH_WAIT_SECONDS
+    while len(batch) < BATCH_MAX_SIZE:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(_batch_queue.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return batch
+
+
+def _batch_loop() -> None:
+    while True:
+        batch = _drain_batch()
+        try:
+            scores = _score_batch([pending.query for pending in batch])
+        except Exception as exc:  # pragma: no cover - surfaced to each waiting caller
+            for pending in batch:
+                pending.error = exc
+        else:
+            for pending, score in zip(batch, scores):
+                pending.score = float(score)
+        finally:
+            for pending in batch:
+                pending.done.set()
+
+
+def _ensure_batch_worker() -> None:
+    global _batch_worker
+    if _batch_worker is None:
+        with _batch_worker_lock:
+            if _batch_worker is None:
+                _batch_worker = threading.Thread(target=_batch_loop, name="embedding-batcher", daemon=True)
+                _batch_worker.start()
+
+
+@lru_cache(maxsize=2048)
+def _score_query(query_norm: str) -> float:
+    """Best cosine similarity between a normalised query and the cattle topic prompts.
+
+    Memoised so repeated questions skip the transformer forward pass entirely; cache misses are
+    handed to the batch worker so concurrent requests share one encode call.
+    """
+    _ensure_batch_worker()
+    pending = _PendingQuery(query_norm)
+    _batch_queue.put(pending)
+    if not pending.done.wait(BATCH_RESULT_TIMEOUT):
+        raise TimeoutError("Timed out waiting for the embedding batch worker")
+    if pending.error is not None:
+        raise pending.error
+    return pending.score
+
+
+def _normalise_query(query: str) -> str:
+    """Fold case, punctuation, and spacing so trivially different phrasings share a cache entry."""
+    return _QUERY_NOISE_RE.sub(" ", (query or "").lower()).strip()
+
+
 def is_cattle_related(query: str, threshold: float | None = None) -> Tuple[bool, float]:
     """Return (is_related, cosine_score) based on semantic similarity to cattle prompts."""
-    if not query:
+    query_norm = _normalise_query(query)
+    if not query_norm:
         return False, 0.0
-    model, topic_emb = _load_model()
-    q_emb = model.encode(query, convert_to_tensor=True)
-    scores = util.cos_sim(q_emb, topic_emb)[0].cpu().numpy()
-    best = float(np.max(scores)) if scores.size else 0.0
+    best = _score_query(query_norm)
     if threshold is None:
         threshold = float(getattr(settings, "ALLOWED_SIMILARITY", 0.65))
     is_related = best >= threshold
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-15 22:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0003_chatsession_context'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['session', '-created_at'], name='chatbot_cha_session_f839ac_idx'),
+        ),
+    ]
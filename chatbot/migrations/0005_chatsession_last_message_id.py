@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-15 22:29
+
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery
+
+
+def backfill_last_message_id(apps, schema_editor):
+    ChatSession = apps.get_model('chatbot', 'ChatSession')
+    ChatMessage = apps.get_model('chatbot', 'ChatMessage')
+    newest = (
+        ChatMessage.objects.filter(session=OuterRef('pk'))
+        .values('session')
+        .annotate(newest=Max('pk'))
+        .values('newest')
+    )
+    ChatSession.objects.update(last_message_id=Subquery(newest))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0004_chatmessage_chatbot_cha_session_f839ac_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatsession',
+            name='last_message_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_last_message_id, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-15 22:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0005_chatsession_last_message_id'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['session', 'role', 'created_at'], name='chatbot_cha_session_49faa8_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-15 22:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0006_chatmessage_chatbot_cha_session_49faa8_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatsession',
+            index=models.Index(fields=['-created_at'], name='chatbot_cha_created_c431b1_idx'),
+        ),
+    ]
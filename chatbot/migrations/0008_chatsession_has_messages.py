@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-15 23:20
+
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef
+
+
+def backfill_has_messages(apps, schema_editor):
+    ChatSession = apps.get_model('chatbot', 'ChatSession')
+    ChatMessage = apps.get_model('chatbot', 'ChatMessage')
+    ChatSession.objects.update(has_messages=Exists(ChatMessage.objects.filter(session=OuterRef('pk'))))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0007_chatsession_chatbot_cha_created_c431b1_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatsession',
+            name='has_messages',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(backfill_has_messages, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='chatsession',
+            name='last_message_id',
+        ),
+    ]
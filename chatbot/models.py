@@ -6,6 +6,14 @@ class ChatSession(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     context = models.JSONField(default=dict, blank=True)
+    # Set once the first ChatMessage is stored; a context change then forks a new session.
+    has_messages = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            # Doctor chat history lists sessions newest first.
+            models.Index(fields=['-created_at']),
+        ]
 
     def __str__(self):
         return f"ChatSession:{self.user.id}:{self.created_at.isoformat()}"
@@ -21,6 +29,14 @@ class ChatMessage(models.Model):
     feedback = models.SmallIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Recent-history lookups: filter by session, newest first.
+            models.Index(fields=['session', '-created_at']),
+            # Per-role lookups within a session (first user message, bot replies) in time order.
+            models.Index(fields=['session', 'role', 'created_at']),
+        ]
+
     def __str__(self):
         return f"{self.role}: {self.text[:40]}"
 
@@ -4,13 +4,25 @@ from __future__ import annotations
 import json
 import logging
 import re
+import string
+import threading
+import time
 from dataclasses import dataclass
-from typing import Any, Dict, Iterable, Optional, Tuple
+from functools import lru_cache
+from itertools import chain
+from typing import Any, Dict, Iterable, Iterator, Optional, Set, Tuple
 
 import requests
 from django.conf import settings
 from django.contrib.sessions.backends.base import SessionBase
 from ipware import get_client_ip
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import ahocorasick
+except ImportError:  # pragma: no cover - optional accelerator; falls back to compiled regexes
+    ahocorasick = None
 
 from .constants import (
     BOVINE_CORE_TERMS,
@@ -33,13 +45,47 @@ logger = logging.getLogger(__name__)
 _location_session_key = "chatbot_location_label"
 
 
+def _build_http_session() -> requests.Session:
+    """Shared session so Groq and GeoIP calls reuse pooled keep-alive connections.
+
+    Read and status retries use urllib3's default idempotent methods, so the GeoIP GETs are
+    retried but the Groq completion POST only retries failed connects, never a sent request.
+    """
+    retry = Retry(
+        total=2,
+        backoff_factor=0.2,
+        status_forcelist=(429, 500, 502, 503, 504),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=10, pool_maxsize=32, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+_HTTP = _build_http_session()
+
+# Process-wide IP -> location label cache, shared by every session arriving from the same address.
+_GEO_CACHE_TTL_SECONDS = 3600
+_GEO_CACHE_MAX_ENTRIES = 4096
+_geo_cache: Dict[str, Tuple[float, str]] = {}
+_geo_cache_lock = threading.Lock()
+
+_NON_ALPHA_RE = re.compile(r"[^A-Za-z,\s]")
+_WS_RE = re.compile(r"\s+")
+_TABS_RE = re.compile(r"[ \t]+")
+_PARA_RE = re.compile(r"\n{2,}")
+_SENT_RE = re.compile(r"(?<=[.!?])\s+")
+
+
 def _clean_location_fragment(value: Any) -> str:
     if value in (None, "", "unknown"):
         return ""
     text = str(value)
     text = IP_PATTERN.sub("", text)
-    text = re.sub(r"[^A-Za-z,\s]", " ", text)
-    text = re.sub(r"\s+", " ", text).strip()
+    text = _NON_ALPHA_RE.sub(" ", text)
+    text = _WS_RE.sub(" ", text).strip()
     return text.title()
 
 
@@ -95,8 +141,31 @@ def _format_location_label(parsed: Dict[str, str]) -> str:
     return ", ".join(ordered.keys()) if ordered else "India"
 
 
+def _cached_geo_label(ip: str) -> Optional[str]:
+    with _geo_cache_lock:
+        entry = _geo_cache.get(ip)
+    if entry and time.monotonic() - entry[0] < _GEO_CACHE_TTL_SECONDS:
+        return entry[1]
+    return None
+
+
+def _store_geo_label(ip: str, label: str) -> None:
+    with _geo_cache_lock:
+        _geo_cache.pop(ip, None)
+        _geo_cache[ip] = (time.monotonic(), label)
+        while len(_geo_cache) > _GEO_CACHE_MAX_ENTRIES:
+            _geo_cache.pop(next(iter(_geo_cache)))
+
+
 def get_location_label(request) -> str:
     """Return a cached location label for the request/session."""
+    label = getattr(request, "_location_label", None)
+    if label is None:
+        label = request._location_label = _resolve_location_label(request)
+    return label
+
+
+def _resolve_location_label(request) -> str:
     session: SessionBase = request.session  # type: ignore[assignment]
     cached = session.get(_location_session_key)
     if cached:
@@ -109,8 +178,13 @@ def get_location_label(request) -> str:
 
     geo_api = getattr(settings, "GEOIP_API_URL", None)
     if geo_api:
+        label = _cached_geo_label(ip) if ip else None
+        if label:
+            session[_location_session_key] = label
+            session.modified = True
+            return label
         try:
-            resp = requests.get(f"{geo_api}?ip={ip}", timeout=5)
+            resp = _HTTP.get(f"{geo_api}?ip={ip}", timeout=5)
             if resp.ok:
                 try:
                     payload = resp.json()
@@ -119,6 +193,8 @@ def get_location_label(request) -> str:
                 parsed = _parse_geo_payload(payload)
                 label = _format_location_label(parsed)
                 if label:
+                    if ip:
+                        _store_geo_label(ip, label)
                     session[_location_session_key] = label
                     session.modified = True
                     return label
@@ -130,27 +206,123 @@ def get_location_label(request) -> str:
     return DEFAULT_LOCATION_LABEL
 
 
-def _has_human_health_intent(lowered: str) -> bool:
-    if any(f"my {term}" in lowered for term in BOVINE_CORE_TERMS):
-        return False
-    if any(term in lowered for term in ("cow", "buffalo", "cattle", "calf", "heifer", "bull", "livestock", "animal")):
+_LOWER_LETTERS = frozenset(string.ascii_lowercase)
+
+
+class _TermScanner:
+    """Report which categories of terms occur as substrings of a text.
+
+    Backed by a single Aho-Corasick automaton (one pass over the text) when pyahocorasick is
+    installed, otherwise by one compiled alternation per category. With ``word_start`` a term
+    only counts at the start of a word: "ox" in "my ox" and "oxen", "heifer" in "heifers", but
+    not "ox" in "toxic". The right edge stays open so plurals and inflections still match.
+    """
+
+    def __init__(self, categories: Dict[str, Iterable[str]], *, word_start: bool = False) -> None:
+        categories = {name: tuple(terms) for name, terms in categories.items() if terms}
+        self._word_start = word_start
+        self._automaton = None
+        self._patterns: Tuple[Tuple[str, "re.Pattern[str]"], ...] = ()
+        if ahocorasick is not None:
+            owners: Dict[str, Set[str]] = {}
+            for name, terms in categories.items():
+                for term in terms:
+                    owners.setdefault(term, set()).add(name)
+            automaton = ahocorasick.Automaton()
+            for term, names in owners.items():
+                automaton.add_word(term, (frozenset(names), len(term)))
+            automaton.make_automaton()
+            self._automaton = automaton
+        else:
+            template = r"(?<![a-z])(?:{})" if word_start else "{}"
+            self._patterns = tuple(
+                (name, re.compile(template.format("|".join(re.escape(term) for term in terms))))
+                for name, terms in categories.items()
+            )
+
+    def _hits(self, text: str) -> Iterator[frozenset]:
+        for end, (names, length) in self._automaton.iter(text):
+            if self._word_start:
+                start = end - length + 1
+                if start > 0 and text[start - 1] in _LOWER_LETTERS:
+                    continue
+            yield names
+
+    def scan(self, text: str) -> Set[str]:
+        if self._automaton is not None:
+            found: Set[str] = set()
+            for names in self._hits(text):
+                found |= names
+            return found
+        return {name for name, pattern in self._patterns if pattern.search(text)}
+
+    def matches(self, text: str) -> bool:
+        """True as soon as any term occurs in ``text``."""
+        if self._automaton is not None:
+            return next(self._hits(text), None) is not None
+        return any(pattern.search(text) for _, pattern in self._patterns)
+
+
+_TOKEN_RE = re.compile(r"[a-z]+")
+_CATTLE_TOKENS = frozenset(
+    {
+        "cow",
+        "cows",
+        "cowshed",
+        "buffalo",
+        "buffaloes",
+        "buffalos",
+        "cattle",
+        "calf",
+        "calves",
+        "heifer",
+        "heifers",
+        "bull",
+        "bulls",
+        "livestock",
+        "animal",
+        "animals",
+    }
+)
+_BOVINE_TOKENS = frozenset(BOVINE_CORE_TERMS)
+_BOVINE_SCANNER = _TermScanner({"bovine": BOVINE_CORE_TERMS}, word_start=True)
+_SELF_TREATMENT_PHRASES = ("medicine for me", "treatment for me", "i need medicine")
+
+_REFUSAL_SCANNER = _TermScanner(
+    {
+        "self_harm": SELF_HARM_TERMS,
+        "violence": VIOLENCE_TERMS,
+        "human_term": HUMAN_HEALTH_TERMS,
+        "human_cue": HUMAN_HEALTH_CUES,
+        "self_treatment": _SELF_TREATMENT_PHRASES,
+    }
+)
+
+
+def _has_human_health_intent(lowered: str, hits: Set[str]) -> bool:
+    if "human_term" not in hits or "human_cue" not in hits:
         return False
-    if not any(term in lowered for term in HUMAN_HEALTH_TERMS):
+    # Only tokenise once both cues are present; any mention of an animal (or "my <bovine term>") overrides.
+    tokens = _TOKEN_RE.findall(lowered)
+    if not _CATTLE_TOKENS.isdisjoint(tokens):
         return False
-    return any(cue in lowered for cue in HUMAN_HEALTH_CUES)
+    return not any(prev == "my" and token in _BOVINE_TOKENS for prev, token in zip(tokens, tokens[1:]))
+
+
+def has_bovine_hint(lowered: str) -> bool:
+    """Whether a lowercased message has a word starting with a bovine term ("heifers", not "toxic")."""
+    return _BOVINE_SCANNER.matches(lowered)
 
 
 def should_refuse(message: str, has_cattle_context: bool) -> Optional[str]:
     lowered = message.lower()
-    for term in SELF_HARM_TERMS:
-        if term in lowered:
-            return "self_harm"
+    hits = _REFUSAL_SCANNER.scan(lowered)
+    if "self_harm" in hits:
+        return "self_harm"
     if not has_cattle_context:
-        if any(term in lowered for term in VIOLENCE_TERMS):
+        if "violence" in hits:
             return "violence"
-        if _has_human_health_intent(lowered):
-            return "human_health"
-        if "medicine for me" in lowered or "treatment for me" in lowered or "i need medicine" in lowered:
+        if "self_treatment" in hits or _has_human_health_intent(lowered, hits):
             return "human_health"
     return None
 
@@ -160,12 +332,12 @@ def beautify_reply(text: str) -> str:
     if not text:
         return text
 
-    text = re.sub(r"[ \t]+", " ", text)
-    paragraphs = [p.strip() for p in re.split(r"\n{2,}", text) if p.strip()]
+    text = _TABS_RE.sub(" ", text)
+    paragraphs = [p.strip() for p in _PARA_RE.split(text) if p.strip()]
     formatted_paragraphs = []
 
     for paragraph in paragraphs:
-        sentences = [s.strip() for s in re.split(r"(?<=[.!?])\s+", paragraph) if s.strip()]
+        sentences = [s.strip() for s in _SENT_RE.split(paragraph) if s.strip()]
         if len(sentences) <= 1:
             formatted_paragraphs.append(paragraph)
             continue
@@ -180,6 +352,7 @@ def beautify_reply(text: str) -> str:
     return "\n\n".join(formatted_paragraphs) if formatted_paragraphs else text
 
 
+@lru_cache(maxsize=None)  # a handful of fixed reasons
 def build_refusal_reply(reason: str) -> str:
     base = "I'm here to support Indian dairy farmers with cattle care and management."
     if reason == "human_health":
@@ -207,6 +380,22 @@ def build_refusal_reply(reason: str) -> str:
 def normalise_context(raw: Any) -> Dict[str, Any]:
     if not isinstance(raw, dict):
         return {}
+    try:
+        # The widget resends the same context every turn. The value type is part of the key
+        # because 1, 1.0 and True hash alike but normalise differently.
+        key = tuple((name, type(value), value) for name, value in raw.items())
+        hash(key)  # nested lists/dicts from a hand-written payload are unhashable
+    except TypeError:
+        return _normalise_context(raw)
+    return dict(_cached_normalised_context(key))
+
+
+@lru_cache(maxsize=512)
+def _cached_normalised_context(key: Tuple[Tuple[str, type, Any], ...]) -> Dict[str, Any]:
+    return _normalise_context({name: value for name, _, value in key})
+
+
+def _normalise_context(raw: Dict[str, Any]) -> Dict[str, Any]:
     cleaned: Dict[str, Any] = {}
     allowed_keys = {
         "source",
@@ -257,46 +446,68 @@ def augment_context_with_cattle(user, context: Dict[str, Any]) -> Dict[str, Any]
         return {}
     from core.models import Cattle  # Local import to avoid circular dependency
 
-    enriched = dict(context)
-    animal_id = enriched.get("animal_id")
-    cattle_obj = None
+    animal_id = context.get("animal_id")
+    cattle_row = None
     if animal_id not in (None, ""):
         try:
             animal_pk = int(animal_id)
         except (TypeError, ValueError):
             animal_pk = None
         if animal_pk:
+            # Plain dict row: no model instantiation for a handful of display fields.
+            cattle_row = (
+                Cattle.objects.filter(pk=animal_pk, owner=user)
+                .values("pk", "name", "tag_number", "breed", "age_years", "daily_milk_yield", "last_vaccination_date")
+                .first()
+            )
+
+    cattle_defaults: Dict[str, Any] = {}
+    saved: Dict[str, Any] = {}
+    if cattle_row:
+        milk_yield = None
+        if cattle_row["daily_milk_yield"] not in (None, ""):
             try:
-                cattle_obj = Cattle.objects.get(pk=animal_pk, owner=user)
-            except Cattle.DoesNotExist:
-                cattle_obj = None
-    if cattle_obj:
-        enriched["animal_id"] = cattle_obj.pk
-        enriched["source"] = "saved"
-        enriched.setdefault("name", cattle_obj.name)
-        enriched.setdefault("tag_number", cattle_obj.tag_number)
-        enriched.setdefault("breed", cattle_obj.breed)
-        enriched.setdefault("age_years", cattle_obj.age_years)
-        if getattr(cattle_obj, "daily_milk_yield", None) not in (None, ""):
-            try:
-                milk = float(cattle_obj.daily_milk_yield)
-                enriched.setdefault("milk_yield", round(milk, 2) if not milk.is_integer() else int(milk))
+                milk = float(cattle_row["daily_milk_yield"])
+                milk_yield = round(milk, 2) if not milk.is_integer() else int(milk)
             except (TypeError, ValueError):
                 pass
-        if cattle_obj.last_vaccination_date:
-            enriched.setdefault("last_vaccination_date", cattle_obj.last_vaccination_date.isoformat())
-    else:
-        enriched.pop("animal_id", None)
-
-    for key, value in list(enriched.items()):
-        if value in (None, ""):
-            enriched.pop(key, None)
-    return enriched
+        vaccinated_on = cattle_row["last_vaccination_date"]
+        cattle_defaults = {
+            "name": cattle_row["name"],
+            "tag_number": cattle_row["tag_number"],
+            "breed": cattle_row["breed"],
+            "age_years": cattle_row["age_years"],
+            "milk_yield": milk_yield,
+            "last_vaccination_date": vaccinated_on.isoformat() if vaccinated_on else None,
+        }
+        saved = {"animal_id": cattle_row["pk"], "source": "saved"}
+
+    # One pass: farmer-supplied values override the saved record, except for the identity keys,
+    # and an animal_id that did not resolve to one of the user's cattle is dropped.
+    return {
+        key: value
+        for key, value in chain(cattle_defaults.items(), context.items(), saved.items())
+        if value not in (None, "") and (saved or key != "animal_id")
+    }
 
 
 def context_summary(ctx: Dict[str, Any]) -> str:
     if not ctx:
         return ""
+    try:
+        # Called for the greeting and again for the Groq prompt with the same context. As in
+        # normalise_context, the value type is part of the key so 1, 1.0 and True stay apart.
+        return _cached_context_summary(frozenset((name, type(value), value) for name, value in ctx.items()))
+    except TypeError:  # unhashable value in a stored context
+        return _format_context_summary(ctx)
+
+
+@lru_cache(maxsize=4096)
+def _cached_context_summary(items: frozenset) -> str:
+    return _format_context_summary({name: value for name, _, value in items})
+
+
+def _format_context_summary(ctx: Dict[str, Any]) -> str:
     parts = []
     if ctx.get("name"):
         parts.append(ctx["name"])
@@ -317,10 +528,14 @@ def context_summary(ctx: Dict[str, Any]) -> str:
 class GroqResponse:
     reply: Optional[str]
     error_code: Optional[str]
+    # Set by call_groq_stream: yields reply text deltas as Groq produces them.
+    stream: Optional[Iterator[str]] = None
 
 
-def call_groq_sync(message: str, session_id: Optional[int] = None, *, location: Optional[str] = None,
-                   context: Optional[Dict[str, Any]] = None) -> GroqResponse:
+def _build_groq_request(
+    message: str, session_id: Optional[int], location: Optional[str], context: Optional[Dict[str, Any]]
+) -> Optional[Tuple[str, Dict[str, str], Dict[str, Any]]]:
+    """Return (api_url, headers, payload) for a chat completion, or None when the API key is missing."""
     api_url = getattr(settings, "CHATBOT_API_URL", "") or DEFAULT_GROQ_API_URL
     api_key = getattr(settings, "CHATBOT_API_KEY", None)
     configured_model = (getattr(settings, "CHATBOT_MODEL", "") or "").strip()
@@ -340,7 +555,7 @@ def call_groq_sync(message: str, session_id: Optional[int] = None, *, location:
     context = context or {}
     if not api_key:
         logger.error("Groq API key missing (CHATBOT_API_KEY)")
-        return GroqResponse(None, "config_missing")
+        return None
 
     headers = {"Content-Type": "application/json", "Authorization": f"Bearer {api_key}"}
 
@@ -366,7 +581,9 @@ def call_groq_sync(message: str, session_id: Optional[int] = None, *, location:
     if session_id:
         from .models import ChatMessage  # Local import to avoid circular dependency
 
-        past_entries = list(ChatMessage.objects.filter(session_id=session_id).order_by("-created_at")[:8])
+        past_entries = list(
+            ChatMessage.objects.filter(session_id=session_id).only("role", "text").order_by("-created_at")[:8]
+        )
         if past_entries and past_entries[0].role == "user" and past_entries[0].text == message:
             past_entries = past_entries[1:]
         for entry in reversed(past_entries):
@@ -391,18 +608,31 @@ def call_groq_sync(message: str, session_id: Optional[int] = None, *, location:
         "temperature": 0.7,
         "max_tokens": 512,
     }
-    try:
-        resp = requests.post(api_url, json=payload, headers=headers, timeout=20)
-        resp.raise_for_status()
-        data = resp.json()
-    except requests.HTTPError as exc:
+    return api_url, headers, payload
+
+
+def _groq_failure(exc: Exception) -> GroqResponse:
+    if isinstance(exc, requests.HTTPError):
         status = exc.response.status_code if exc.response is not None else "unknown"
         body = exc.response.text if exc.response is not None else str(exc)
         logger.exception("Groq HTTP error (status %s): %s", status, body[:500])
         return GroqResponse(None, f"http_{status}")
+    logger.exception("Groq request failed: %s", exc)
+    return GroqResponse(None, "request_failed")
+
+
+def call_groq_sync(message: str, session_id: Optional[int] = None, *, location: Optional[str] = None,
+                   context: Optional[Dict[str, Any]] = None) -> GroqResponse:
+    prepared = _build_groq_request(message, session_id, location, context)
+    if prepared is None:
+        return GroqResponse(None, "config_missing")
+    api_url, headers, payload = prepared
+    try:
+        resp = _HTTP.post(api_url, json=payload, headers=headers, timeout=20)
+        resp.raise_for_status()
+        data = resp.json()
     except Exception as exc:  # pragma: no cover - defensive logging
-        logger.exception("Groq request failed: %s", exc)
-        return GroqResponse(None, "request_failed")
+        return _groq_failure(exc)
 
     reply_text = data.get("choices", [{}])[0].get("message", {}).get("content")
     if not reply_text:
@@ -413,6 +643,48 @@ def call_groq_sync(message: str, session_id: Optional[int] = None, *, location:
     return GroqResponse(reply_text, None)
 
 
+def _iter_groq_deltas(resp: requests.Response) -> Iterator[str]:
+    """Yield content deltas from a Groq server-sent event stream until ``[DONE]``."""
+    try:
+        for raw_line in resp.iter_lines():
+            line = raw_line.decode("utf-8", errors="replace").strip() if raw_line else ""
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                break
+            try:
+                chunk = json.loads(data)
+            except ValueError:
+                logger.warning("Skipping malformed Groq stream chunk: %s", data[:200])
+                continue
+            delta = (chunk.get("choices") or [{}])[0].get("delta", {}).get("content")
+            if delta:
+                yield delta
+    finally:
+        resp.close()
+
+
+def call_groq_stream(message: str, session_id: Optional[int] = None, *, location: Optional[str] = None,
+                     context: Optional[Dict[str, Any]] = None) -> GroqResponse:
+    """Streaming variant of :func:`call_groq_sync`.
+
+    Returns as soon as Groq accepts the request; the reply is read lazily from ``GroqResponse.stream``
+    so callers can forward the first tokens without waiting for the whole completion.
+    """
+    prepared = _build_groq_request(message, session_id, location, context)
+    if prepared is None:
+        return GroqResponse(None, "config_missing")
+    api_url, headers, payload = prepared
+    payload["stream"] = True
+    try:
+        resp = _HTTP.post(api_url, json=payload, headers=headers, stream=True, timeout=20)
+        resp.raise_for_status()
+    except Exception as exc:  # pragma: no cover - defensive logging
+        return _groq_failure(exc)
+    return GroqResponse(None, None, stream=_iter_groq_deltas(resp))
+
+
 def greeting_for_context(context: Dict[str, Any]) -> str:
     welcome = (
         "Namaste! I'm GAAYATRI's dairy assistant. Ask me about cow or buffalo health, milk yield, nutrition, "
@@ -424,16 +696,28 @@ def greeting_for_context(context: Dict[str, Any]) -> str:
     return beautify_reply(welcome)
 
 
-def matches_greeting(text: str) -> bool:
+# Only short messages ("hi", "namaste ji") repeat often enough to be worth caching; longer free-form
+# questions would pin large strings in the cache for almost no hits.
+_GREETING_CACHE_MAX_LENGTH = 64
+
+
+@lru_cache(maxsize=1024)
+def _cached_greeting_match(text: str) -> bool:
     return bool(GREETING_PATTERN.search(text.lower()))
 
 
+def matches_greeting(text: str) -> bool:
+    if len(text) > _GREETING_CACHE_MAX_LENGTH:
+        return bool(GREETING_PATTERN.search(text.lower()))
+    return _cached_greeting_match(text)
+
+
 def keyword_match(lowered: str) -> bool:
     return bool(CATTLE_KEYWORD_PATTERN.search(lowered))
 
 
 def embedding_debug_log(score: Optional[float], passed: bool, user_id: Any) -> None:
-    if score is None:
+    if score is None or not logger.isEnabledFor(logging.DEBUG):
         return
     logger.debug(
         "Semantic filter score %.3f (pass=%s) for user %s",
@@ -446,10 +730,12 @@ def embedding_debug_log(score: Optional[float], passed: bool, user_id: Any) -> N
 __all__ = [
     "beautify_reply",
     "build_refusal_reply",
+    "call_groq_stream",
     "call_groq_sync",
     "context_summary",
     "get_location_label",
     "greeting_for_context",
+    "has_bovine_hint",
     "keyword_match",
     "matches_greeting",
     "normalise_context",
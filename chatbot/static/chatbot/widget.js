@@ -258,6 +258,39 @@ document.addEventListener('DOMContentLoaded', function(){
   bubble?.addEventListener('click', openPanel);
   closeBtn?.addEventListener('click', closePanel);
 
+  // Read the ?stream=1 server-sent events: show deltas in the placeholder, return the final done/error payload.
+  async function readReplyStream(res, placeholder){
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    const bubbleEl = placeholder.querySelector('.bubble');
+    let buffer = '', text = '', result = null;
+    while(true){
+      const {done, value} = await reader.read();
+      if(done) break;
+      buffer += decoder.decode(value, {stream: true});
+      let boundary;
+      while((boundary = buffer.indexOf('\n\n')) !== -1){
+        const frame = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+        let event = 'message', data = '';
+        frame.split('\n').forEach(function(line){
+          if(line.startsWith('event:')) event = line.slice(6).trim();
+          else if(line.startsWith('data:')) data += line.slice(5).trim();
+        });
+        if(!data) continue;
+        const payload = JSON.parse(data);
+        if(event === 'message'){
+          text += payload.delta || '';
+          bubbleEl.innerHTML = renderFormatted(text);
+          messagesEl.scrollTop = messagesEl.scrollHeight;
+        } else {
+          result = payload;
+        }
+      }
+    }
+    return result || {ok: false, error: 'Network error. Try again.'};
+  }
+
   async function sendMessage(text){
     if(!text) return;
     if(!ensureContext()) return;
@@ -268,12 +301,16 @@ document.addEventListener('DOMContentLoaded', function(){
     messagesEl.scrollTop = messagesEl.scrollHeight;
     try{
       const csrf = document.querySelector('input[name=csrfmiddlewaretoken]')?.value || (document.cookie.match(/(^| )csrftoken=([^;]+)/)?.[2] || '');
-      const res = await fetch(apiUrl, {
+      const streamUrl = new URL(apiUrl, window.location.origin);
+      streamUrl.searchParams.set('stream', '1');
+      const res = await fetch(streamUrl, {
         method: 'POST', credentials:'same-origin',
         headers: {'Content-Type':'application/json', 'X-CSRFToken': csrf},
         body: JSON.stringify({message: text, context: chatContext})
       });
-      const json = await res.json();
+      // Greetings, refusals and errors still come back as plain JSON.
+      const streaming = (res.headers.get('Content-Type') || '').includes('text/event-stream');
+      const json = streaming ? await readReplyStream(res, placeholder) : await res.json();
       placeholder.remove();
       if(!res.ok || !json.ok){
         const errorMsg = json.error || json.reply || 'Error';
@@ -1,32 +1,55 @@
 import json
 from typing import cast
-from unittest.mock import patch
 
 from django.test import TestCase, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 
 from core.models import Cattle
+from . import views
 from .models import ChatSession, ChatMessage
 from .constants import DEFAULT_LOCATION_LABEL
-from .services import GroqResponse
+from .services import GroqResponse, augment_context_with_cattle, context_summary
+
+
+class _Stub:
+    """Call-counting stand-in for a view dependency; much cheaper to build than a MagicMock."""
+
+    def __init__(self, result=None, wraps=None):
+        self.result = result
+        self.wraps = wraps
+        self.calls = 0
+
+    def __call__(self, *args, **kwargs):
+        self.calls += 1
+        if self.wraps is not None:
+            return self.wraps(*args, **kwargs)
+        return self.result
 
 
 @override_settings(CHATBOT_API_KEY='test-key')
 class ChatApiTests(TestCase):
-    def setUp(self):
-        self.user = get_user_model().objects.create_user(
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
             username='farmer1', password='pass123', is_farmer=True
         )
-        self.cattle = Cattle.objects.create(
-            owner=self.user,
+        cls.cattle = Cattle.objects.create(
+            owner=cls.user,
             tag_number='T-101',
             name='Gauri',
             breed='Gir',
             age_years=5,
             daily_milk_yield=12.5,
         )
-        self.cattle_id = str(self.cattle.pk)
+        cls.cattle_id = str(cls.cattle.pk)
+
+    def _swap(self, name, stub):
+        """Replace ``chatbot.views.<name>`` with ``stub`` for the rest of the test."""
+        original = getattr(views, name)
+        setattr(views, name, stub)
+        self.addCleanup(setattr, views, name, original)
+        return stub
 
     def _post(self, payload):
         return self.client.post(
@@ -35,8 +58,8 @@ class ChatApiTests(TestCase):
             content_type='application/json',
         )
 
-    @patch('chatbot.views.call_groq_sync', return_value=GroqResponse('Mock reply', None))
-    def test_chat_api_saves_context_with_cattle_details(self, mock_call):
+    def test_chat_api_saves_context_with_cattle_details(self):
+        groq = self._swap('call_groq_sync', _Stub(GroqResponse('Mock reply', None)))
         self.client.force_login(self.user)
         payload = {
             'message': 'My cow has mastitis',
@@ -64,10 +87,27 @@ class ChatApiTests(TestCase):
         self.assertEqual(messages.count(), 2)
         self.assertEqual(messages[0].role, 'user')
         self.assertEqual(messages[1].role, 'bot')
-        mock_call.assert_called_once()
+        self.assertEqual(groq.calls, 1)
+
+    def test_chat_api_reuses_unchanged_context(self):
+        self._swap('call_groq_sync', _Stub(GroqResponse('Mock reply', None)))
+        augment = self._swap('augment_context_with_cattle', _Stub(wraps=augment_context_with_cattle))
+        self.client.force_login(self.user)
+        payload = {
+            'message': 'My cow is not eating well',
+            'context': {'animal_id': self.cattle_id, 'issue': 'Appetite'},
+        }
+
+        first_session_id = self._post(payload).json()['session_id']
+        payload['message'] = 'Should I change her feed?'
+        second_session_id = self._post(payload).json()['session_id']
 
-    @patch('chatbot.views.call_groq_sync', return_value=GroqResponse('Follow up reply', None))
-    def test_chat_api_creates_new_session_when_context_changes(self, mock_call):
+        self.assertEqual(first_session_id, second_session_id)
+        self.assertEqual(augment.calls, 1)
+        self.assertEqual(ChatSession.objects.get(pk=first_session_id).context['name'], self.cattle.name)
+
+    def test_chat_api_creates_new_session_when_context_changes(self):
+        self._swap('call_groq_sync', _Stub(GroqResponse('Follow up reply', None)))
         self.client.force_login(self.user)
 
         first_payload = {
@@ -111,8 +151,8 @@ class ChatApiTests(TestCase):
         self.assertEqual(new_context['breed'], 'Jersey')
         self.assertEqual(new_context['issue'], 'Fever')
 
-    @patch('chatbot.views.call_groq_sync', return_value=GroqResponse('Sanitised response', None))
-    def test_chat_api_masks_ip_and_defaults_to_india(self, mock_call):
+    def test_chat_api_masks_ip_and_defaults_to_india(self):
+        groq = self._swap('call_groq_sync', _Stub(GroqResponse('Sanitised response', None)))
         self.client.force_login(self.user)
         payload = {
             'message': 'Need help with mastitis care',
@@ -131,17 +171,17 @@ class ChatApiTests(TestCase):
 
         self.assertEqual(response.status_code, 200)
         session_id = response.json()['session_id']
-        user_message = ChatMessage.objects.filter(session_id=session_id, role='user').first()
-        self.assertIsNotNone(user_message)
-        user_message = cast(ChatMessage, user_message)
-        self.assertIsInstance(user_message.location, str)
-        location_value = user_message.location or ''
+        location_value = (
+            ChatMessage.objects.filter(session_id=session_id, role='user').values_list('location', flat=True).first()
+        )
+        self.assertIsInstance(location_value, str)
+        location_value = cast(str, location_value)
         self.assertEqual(location_value, DEFAULT_LOCATION_LABEL)
         self.assertNotIn('203.0.113.24', location_value)
-        mock_call.assert_called_once()
+        self.assertEqual(groq.calls, 1)
 
-    @patch('chatbot.views.call_groq_sync')
-    def test_chat_api_refuses_human_health_requests(self, mock_call):
+    def test_chat_api_refuses_human_health_requests(self):
+        groq = self._swap('call_groq_sync', _Stub())
         self.client.force_login(self.user)
         payload = {
             'message': 'I have a high fever and need medicine suggestions',
@@ -152,8 +192,73 @@ class ChatApiTests(TestCase):
         data = response.json()
         self.assertTrue(data['ok'])
         self.assertIn('doctor', data['reply'].lower())
-        mock_call.assert_not_called()
-        bot_message = ChatMessage.objects.filter(role='bot').last()
-        self.assertIsNotNone(bot_message)
-        bot_message = cast(ChatMessage, bot_message)
-        self.assertIn('doctor', bot_message.text.lower())
+        self.assertEqual(groq.calls, 0)
+        bot_row = ChatMessage.objects.filter(role='bot').values_list('pk', 'session_id', 'text').last()
+        self.assertIsNotNone(bot_row)
+        bot_pk, bot_session_id, bot_text = cast(tuple, bot_row)
+        self.assertIn('doctor', bot_text.lower())
+        self.assertEqual(data['bot_message_id'], bot_pk)
+        self.assertEqual(
+            list(ChatMessage.objects.filter(session_id=bot_session_id).order_by('pk').values_list('role', flat=True)),
+            ['user', 'bot'],
+        )
+
+    def test_chat_api_streams_reply_as_server_sent_events(self):
+        self._swap('call_groq_stream', _Stub(GroqResponse(None, None, stream=iter(['Check her ', 'udder daily.']))))
+        self.client.force_login(self.user)
+
+        response = self.client.post(
+            reverse('chatbot:api') + '?stream=1',
+            data=json.dumps({'message': 'My cow has mastitis'}),
+            content_type='application/json',
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        frames = b''.join(response.streaming_content).decode().strip().split('\n\n')
+        self.assertEqual([json.loads(f[len('data: '):])['delta'] for f in frames[:2]], ['Check her ', 'udder daily.'])
+        event, data = frames[2].split('\n')
+        self.assertEqual(event, 'event: done')
+        done = json.loads(data[len('data: '):])
+        bot_message = ChatMessage.objects.get(pk=done['bot_message_id'])
+        self.assertEqual(bot_message.text, done['reply'])
+        self.assertIn('udder daily', bot_message.text)
+
+    def test_bovine_terms_inside_other_words_do_not_bypass_refusal(self):
+        groq = self._swap('call_groq_sync', _Stub())
+        self.client.force_login(self.user)
+
+        # "ox" in "toxic" is not a mention of cattle
+        response = self._post({'message': 'I have a high fever after a toxic rash, which medicine should I take?'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('doctor', response.json()['reply'].lower())
+        self.assertEqual(groq.calls, 0)
+
+    def test_plural_cattle_questions_are_not_refused(self):
+        groq = self._swap('call_groq_sync', _Stub(GroqResponse('Mock reply', None)))
+        self.client.force_login(self.user)
+        messages = (
+            'My heifers have fever, I need medicine for them',
+            'my bulls are sick and i need medicine',
+            'udders swollen, i need medicine',
+        )
+
+        for message in messages:
+            with self.subTest(message=message):
+                response = self._post({'message': message})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()['reply'], 'Mock reply')
+        self.assertEqual(groq.calls, len(messages))
+
+    def test_context_summary_cache_keeps_value_types_apart(self):
+        # 1, 1.0 and True hash alike, so a cached summary must not be reused across them
+        self.assertEqual(context_summary({'name': 'X', 'age_years': 1}), 'X, 1 years old')
+        self.assertEqual(context_summary({'name': 'X', 'age_years': 1.0}), 'X, 1.0 years old')
+
+    def test_chat_api_rejects_anonymous_with_json_401(self):
+        groq = self._swap('call_groq_sync', _Stub())
+        response = self._post({'message': 'My cow has fever'})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json(), {'ok': False, 'error': 'unauthenticated'})
+        self.assertEqual(groq.calls, 0)
+        self.assertFalse(ChatSession.objects.exists())
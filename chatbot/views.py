@@ -1,25 +1,29 @@
-import json
+import hashlib
 import logging
-from typing import Any, Dict, Optional
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Iterator, Optional
 
+import orjson
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import render
 from django.views.decorators.http import require_POST
 
 from core.models import Cattle
 
-from .constants import BOVINE_CORE_TERMS, DEFAULT_LOCATION_LABEL
+from .constants import DEFAULT_LOCATION_LABEL
 from .models import ChatMessage, ChatSession
 from .services import (
     augment_context_with_cattle,
     beautify_reply,
     build_refusal_reply,
+    call_groq_stream,
     call_groq_sync,
     context_summary,
     embedding_debug_log,
     get_location_label,
     greeting_for_context,
+    has_bovine_hint,
     keyword_match,
     matches_greeting,
     normalise_context,
@@ -29,7 +33,9 @@ from .services import (
 
 embedding_is_cattle_related: Optional[Any] = None
 _embedding_import_error: Optional[Exception] = None
+_EMBED_POOL_SIZE = 1
 try:
+    from .embedding_filter import BATCH_MAX_SIZE as _EMBED_POOL_SIZE  # type: ignore
     from .embedding_filter import is_cattle_related as embedding_is_cattle_related  # type: ignore
 except Exception as exc:  # pragma: no cover - optional dependency or load failure
     _embedding_import_error = exc
@@ -41,139 +47,248 @@ logger = logging.getLogger(__name__)
 if _embedding_import_error:
     logger.warning("Semantic embedding filter disabled: %s", _embedding_import_error)
 
+_SCOPE_REPLY = beautify_reply(
+    "I'm focused on dairy cattle support. Choose one of your saved animals or share breed, age, milk yield, and "
+    "current symptoms so I can guide you better."
+)
 
-@require_POST
-@login_required
-def chat_api(request):
-    data = json.loads(request.body.decode("utf-8") or "{}")
-    msg = (data.get("message") or "").strip()
-    if not msg:
-        return JsonResponse({"ok": False, "error": "empty_message"}, status=400)
+# Runs the embedding check while the request thread does the GeoIP lookup and DB work. Each
+# worker blocks until the batcher answers, so the pool must be as wide as a batch or the
+# batcher could never coalesce more queries than there are workers.
+_EMBED_POOL = ThreadPoolExecutor(max_workers=_EMBED_POOL_SIZE, thread_name_prefix="chatbot-embed")
+
+
+def _json(payload: Dict[str, Any], status: int = 200) -> HttpResponse:
+    """JSON response serialised with orjson instead of JsonResponse's stdlib encoder."""
+    return HttpResponse(orjson.dumps(payload), status=status, content_type="application/json")
 
+
+def _require_farmer(request) -> Optional[HttpResponse]:
+    """JSON 401/403 for API callers who are not signed-in farmers, instead of a login redirect."""
+    if not request.user.is_authenticated:
+        return _json({"ok": False, "error": "unauthenticated"}, status=401)
     if not getattr(request.user, "is_farmer", False):
-        return JsonResponse(
+        return _json(
             {"ok": False, "error": "forbidden", "detail": "chatbot available to farmers only"},
             status=403,
         )
+    return None
+
+
+def _context_signature(context: Dict[str, Any]) -> str:
+    """Digest of a normalised context that is stable across processes, unlike ``hash()``."""
+    return hashlib.blake2b(orjson.dumps(context, option=orjson.OPT_SORT_KEYS), digest_size=16).hexdigest()
+
+
+def _save_exchange(user_msg: ChatMessage, reply: str) -> ChatMessage:
+    """Persist an unsaved user message and the bot's reply with one multi-row INSERT."""
+    bot_msg = ChatMessage(session=user_msg.session, role="bot", text=reply, location=user_msg.location)
+    ChatMessage.objects.bulk_create([user_msg, bot_msg])
+    _mark_session_started(user_msg.session)
+    return bot_msg
+
+
+def _mark_session_started(session: ChatSession) -> None:
+    """Flag the session as non-empty so a context change forks it, without a query on later turns.
+
+    Only the first stored message writes the flag, so later turns skip the UPDATE entirely.
+    """
+    if session.has_messages:
+        return
+    ChatSession.objects.filter(pk=session.pk, has_messages=False).update(has_messages=True)
+    session.has_messages = True
+
+
+@require_POST
+def chat_api(request):
+    denied = _require_farmer(request)
+    if denied is not None:
+        return denied
+
+    data = orjson.loads(request.body or b"{}")
+    msg = (data.get("message") or "").strip()
+    if not msg:
+        return _json({"ok": False, "error": "empty_message"}, status=400)
 
     active_session_id = request.session.get("chatbot_session_id")
     session = None
     if active_session_id:
-        session = ChatSession.objects.filter(pk=active_session_id, user=request.user).first()
+        session = (
+            ChatSession.objects.filter(pk=active_session_id, user=request.user)
+            .only("pk", "user_id", "context", "has_messages")
+            .first()
+        )
     if session is None:
         session = ChatSession.objects.create(user=request.user)
         request.session["chatbot_session_id"] = session.pk
 
-    incoming_context = normalise_context(data.get("context"))
-    incoming_context = augment_context_with_cattle(request.user, incoming_context)
-
     context = session.context or {}
+    raw_context = data.get("context")
+    incoming_context = normalise_context(raw_context) if raw_context is not None else {}
     if incoming_context:
-        if context != incoming_context:
-            if ChatMessage.objects.filter(session=session).exists():
-                session = ChatSession.objects.create(user=request.user, context=incoming_context)
-                request.session["chatbot_session_id"] = session.pk
-            else:
-                session.context = incoming_context
-                session.save(update_fields=["context"])
-            context = incoming_context
-        else:
+        # The widget resends the same context on every turn; once it has been merged into this
+        # session, skip the Cattle lookup and the dict comparison.
+        signature = [session.pk, _context_signature(incoming_context)]
+        if request.session.get("chatbot_ctx_sig") != signature:
+            incoming_context = augment_context_with_cattle(request.user, incoming_context)
+            if context != incoming_context:
+                if session.has_messages:
+                    session = ChatSession.objects.create(user=request.user, context=incoming_context)
+                    request.session["chatbot_session_id"] = session.pk
+                else:
+                    session.context = incoming_context
+                    session.save(update_fields=["context"])
             context = incoming_context
+            request.session["chatbot_ctx_sig"] = [session.pk, signature[1]]
 
     has_context = bool(context)
     lowered = msg.lower()
-    bovine_hint = any(term in lowered for term in BOVINE_CORE_TERMS)
-
+    bovine_hint = has_bovine_hint(lowered)
+    is_greeting = matches_greeting(lowered)
     keyword_hit = keyword_match(lowered)
-    embedding_pass = False
-    embedding_score: Optional[float] = None
-    if embedding_is_cattle_related:
-        try:
-            embedding_pass, embedding_score = embedding_is_cattle_related(msg)
-        except Exception as exc:  # pragma: no cover - defensive logging
-            logger.exception("Embedding similarity check failed: %s", exc)
-            embedding_pass = False
-    elif _embedding_import_error:
-        logger.debug("Embedding filter unavailable: %s", _embedding_import_error)
+
+    # Tiered scope check: context and the keyword regex are free, so the transformer only runs
+    # for messages neither of them accepts. Start it now so it overlaps with the work below.
+    embedding_future: Optional[Future] = None
+    if not (is_greeting or has_context or keyword_hit):
+        if embedding_is_cattle_related:
+            embedding_future = _EMBED_POOL.submit(embedding_is_cattle_related, msg)
+        elif _embedding_import_error:
+            logger.debug("Embedding filter unavailable: %s", _embedding_import_error)
 
     location_label = get_location_label(request)
-    ChatMessage.objects.create(session=session, role="user", text=msg, location=location_label)
+    # Saved together with the reply on the early-exit paths, or just before the model call.
+    user_msg = ChatMessage(session=session, role="user", text=msg, location=location_label)
 
-    if matches_greeting(lowered):
+    if is_greeting:
         welcome = greeting_for_context(context if has_context else {})
-        bot_msg = ChatMessage.objects.create(session=session, role="bot", text=welcome, location=location_label)
-        return JsonResponse({"ok": True, "reply": welcome, "bot_message_id": bot_msg.pk, "session_id": session.pk})
+        bot_msg = _save_exchange(user_msg, welcome)
+        return _json({"ok": True, "reply": welcome, "bot_message_id": bot_msg.pk, "session_id": session.pk})
 
     refusal_reason = should_refuse(msg, has_context or bovine_hint)
     if refusal_reason:
+        # A pending embedding check is left to finish; it has usually started already, and its
+        # score is cached for the next time the same question arrives.
         refusal_reply = build_refusal_reply(refusal_reason)
-        bot_msg = ChatMessage.objects.create(session=session, role="bot", text=refusal_reply, location=location_label)
-        return JsonResponse({"ok": True, "reply": refusal_reply, "bot_message_id": bot_msg.pk, "session_id": session.pk})
+        bot_msg = _save_exchange(user_msg, refusal_reply)
+        return _json({"ok": True, "reply": refusal_reply, "bot_message_id": bot_msg.pk, "session_id": session.pk})
+
+    embedding_pass = False
+    embedding_score: Optional[float] = None
+    if embedding_future is not None:
+        try:
+            embedding_pass, embedding_score = embedding_future.result()
+        except Exception as exc:  # pragma: no cover - defensive logging
+            logger.exception("Embedding similarity check failed: %s", exc)
+            embedding_pass = False
 
     if not (has_context or keyword_hit or embedding_pass):
-        scope_msg = beautify_reply(
-            "I'm focused on dairy cattle support. Choose one of your saved animals or share breed, age, milk yield, and "
-            "current symptoms so I can guide you better."
-        )
-        bot_msg = ChatMessage.objects.create(session=session, role="bot", text=scope_msg, location=location_label)
-        return JsonResponse({"ok": True, "reply": scope_msg, "bot_message_id": bot_msg.pk, "session_id": session.pk})
+        bot_msg = _save_exchange(user_msg, _SCOPE_REPLY)
+        return _json({"ok": True, "reply": _SCOPE_REPLY, "bot_message_id": bot_msg.pk, "session_id": session.pk})
 
-    embedding_debug_log(embedding_score, embedding_pass, getattr(request.user, "id", "anonymous"))
+    embedding_debug_log(embedding_score, embedding_pass, request.user.id)
 
-    groq_response = call_groq_sync(
+    user_msg.save()
+    # ?stream=1 answers with server-sent events so the widget can show tokens as they arrive.
+    call_groq = call_groq_stream if request.GET.get("stream") == "1" else call_groq_sync
+    groq_response = call_groq(
         msg,
         session_id=session.pk,
         location=location_label,
         context=context,
     )
+    if groq_response.stream is not None:
+        response = StreamingHttpResponse(
+            _stream_reply(groq_response.stream, user_msg), content_type="text/event-stream"
+        )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
     if groq_response.reply is None:
-        return JsonResponse(
-            {
-                "ok": False,
-                "error": "model_error",
-                "detail": "Unable to contact the GAAYATRI model right now. Please try again shortly.",
-                "code": groq_response.error_code,
-                "session_id": session.pk,
-            },
+        _mark_session_started(session)
+        return _json(
+            _model_error(session, groq_response.error_code),
             status=502 if groq_response.error_code else 500,
         )
 
     beautified_reply = beautify_reply(groq_response.reply)
     bot_msg = ChatMessage.objects.create(session=session, role="bot", text=beautified_reply, location=location_label)
-    return JsonResponse({"ok": True, "reply": beautified_reply, "bot_message_id": bot_msg.pk, "session_id": session.pk})
+    _mark_session_started(session)
+    return _json({"ok": True, "reply": beautified_reply, "bot_message_id": bot_msg.pk, "session_id": session.pk})
+
+
+def _model_error(session: ChatSession, code: Optional[str]) -> Dict[str, Any]:
+    return {
+        "ok": False,
+        "error": "model_error",
+        "detail": "Unable to contact the GAAYATRI model right now. Please try again shortly.",
+        "code": code,
+        "session_id": session.pk,
+    }
+
+
+def _sse(payload: Dict[str, Any], event: Optional[str] = None) -> bytes:
+    frame = b"data: " + orjson.dumps(payload) + b"\n\n"
+    return b"event: " + event.encode() + b"\n" + frame if event else frame
+
+
+def _stream_reply(deltas: Iterator[str], user_msg: ChatMessage) -> Iterator[bytes]:
+    """Relay Groq deltas as SSE frames, then store the full reply and send it in a ``done`` event."""
+    session = user_msg.session
+    parts = []
+    error_code = None
+    try:
+        for delta in deltas:
+            parts.append(delta)
+            yield _sse({"delta": delta})
+    except Exception as exc:  # pragma: no cover - defensive logging
+        logger.exception("Groq stream interrupted: %s", exc)
+        error_code = "stream_interrupted"
+    if error_code is None and not parts:
+        error_code = "empty_response"
+    if error_code is not None:
+        _mark_session_started(session)
+        yield _sse(_model_error(session, error_code), event="error")
+        return
+
+    beautified_reply = beautify_reply("".join(parts))
+    bot_msg = ChatMessage.objects.create(session=session, role="bot", text=beautified_reply, location=user_msg.location)
+    _mark_session_started(session)
+    yield _sse(
+        {"ok": True, "reply": beautified_reply, "bot_message_id": bot_msg.pk, "session_id": session.pk},
+        event="done",
+    )
 
 
 @login_required
 def bot_ui(request):
     """Render the small bot UI (can be included on pages)."""
     if not getattr(request.user, 'is_farmer', False):
-        return JsonResponse({'ok': False, 'error': 'forbidden', 'detail': 'chat UI available to farmers only'}, status=403)
+        return _json({'ok': False, 'error': 'forbidden', 'detail': 'chat UI available to farmers only'}, status=403)
     return render(request, 'chatbot/bot.html')
 
 
 @require_POST
-@login_required
 def feedback(request):
     """Accept feedback for a bot message. POST JSON: {"message_id": <id>, "feedback": 1|-1} """
+    denied = _require_farmer(request)
+    if denied is not None:
+        return denied
+
     try:
-        data = json.loads(request.body.decode('utf-8') or '{}')
+        data = orjson.loads(request.body or b'{}')
         mid = int(data.get('message_id'))
         fb = int(data.get('feedback'))
     except Exception:
-        return JsonResponse({'ok': False, 'error': 'invalid_payload'}, status=400)
-
-    try:
-        m = ChatMessage.objects.get(pk=mid, role='bot')
-    except ChatMessage.DoesNotExist:
-        return JsonResponse({'ok': False, 'error': 'not_found'}, status=404)
-
-    # only allow feedback from the same session user (simple check)
-    if m.session.user != request.user:
-        return JsonResponse({'ok': False, 'error': 'forbidden'}, status=403)
+        return _json({'ok': False, 'error': 'invalid_payload'}, status=400)
 
     if fb not in (-1, 0, 1):
-        return JsonResponse({'ok': False, 'error': 'invalid_feedback'}, status=400)
+        return _json({'ok': False, 'error': 'invalid_feedback'}, status=400)
+
+    # only allow feedback from the same session user; the ownership check rides on the UPDATE
+    if ChatMessage.objects.filter(pk=mid, role='bot', session__user=request.user).update(feedback=fb):
+        return _json({'ok': True})
 
-    m.feedback = fb
-    m.save()
-    return JsonResponse({'ok': True})
+    if ChatMessage.objects.filter(pk=mid, role='bot').exists():
+        return _json({'ok': False, 'error': 'forbidden'}, status=403)
+    return _json({'ok': False, 'error': 'not_found'}, status=404)
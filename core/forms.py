@@ -90,6 +90,14 @@ class StockUpdateForm(forms.Form):
     action = forms.ChoiceField(choices=ACTION_CHOICES, widget=forms.RadioSelect(attrs={'class': 'form-check-input'}))
     quantity = forms.FloatField(min_value=0.1, widget=forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'Amount'}))
     notes = forms.CharField(required=False, widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Optional notes (e.g. Morning feed)'}))
+
+# One row of the multi-item stock update on the inventory page; rows left without a quantity are skipped
+class BulkStockUpdateForm(StockUpdateForm):
+    item_id = forms.IntegerField(widget=forms.HiddenInput)
+    action = forms.ChoiceField(choices=StockUpdateForm.ACTION_CHOICES, widget=forms.Select(attrs={'class': 'form-select form-select-sm'}))
+    quantity = forms.FloatField(min_value=0.1, required=False, widget=forms.NumberInput(attrs={'class': 'form-control form-control-sm', 'placeholder': 'Amount'}))
+
+BulkStockUpdateFormSet = forms.formset_factory(BulkStockUpdateForm, extra=0)
     
 # --- Append to core/forms.py ---
 from .models import Message
@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import DoctorProfile, User
+
+DOCTOR_ROSTER_CACHE_KEY = 'core:doctor_roster:v1'
+
+# Applied to every new SQLite connection; none of these outlive the connection. Django 4.2's
+# SQLite backend has no init_command option, so the pragmas are issued from this signal instead.
+SQLITE_PRAGMAS = (
+    'PRAGMA cache_size=-65536',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA mmap_size=268435456',
+)
+
+# WAL lets page reads continue while a write is in progress, and NORMAL sync is durable under WAL
+# except for power loss. journal_mode is stored in the database file itself, so this is opt-in
+# (settings.SQLITE_WAL_MODE) to keep the committed development database untouched.
+SQLITE_WAL_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+)
+
+
+@receiver(connection_created)
+def tune_sqlite_connection(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = SQLITE_PRAGMAS + SQLITE_WAL_PRAGMAS if settings.SQLITE_WAL_MODE else SQLITE_PRAGMAS
+    with connection.cursor() as cursor:
+        for pragma in pragmas:
+            cursor.execute(pragma)
+
+
+@receiver([post_save, post_delete], sender=User)
+@receiver([post_save, post_delete], sender=DoctorProfile)
+def invalidate_doctor_roster(sender, instance, update_fields=None, **kwargs):
+    # Clears this process's copy only unless a shared cache backend is configured
+    # Logging in only touches last_login, which the roster does not show
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    cache.delete(DOCTOR_ROSTER_CACHE_KEY)
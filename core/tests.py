@@ -1,22 +1,25 @@
 from django.test import TestCase
 from django.urls import reverse
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
 
 from chatbot.models import ChatSession, ChatMessage
-from .models import Cattle
+from .models import Cattle, InventoryItem, InventoryHistory, Message
 
 
 class DoctorChatHistoryTests(TestCase):
-    def setUp(self):
+    @classmethod
+    def setUpTestData(cls):
         User = get_user_model()
-        self.doctor = User.objects.create_user(
+        cls.doctor = User.objects.create_user(
             username='doc1', password='pass123', is_doctor=True
         )
-        self.farmer = User.objects.create_user(
+        cls.farmer = User.objects.create_user(
             username='farmer1', password='pass123', is_farmer=True
         )
-        self.cattle = Cattle.objects.create(
-            owner=self.farmer,
+        cls.cattle = Cattle.objects.create(
+            owner=cls.farmer,
             tag_number='TAG-9',
             name='Lakshmi',
             breed='Sahiwal',
@@ -24,17 +27,17 @@ class DoctorChatHistoryTests(TestCase):
             daily_milk_yield=11.2,
         )
         context = {
-            'animal_id': self.cattle.pk,
-            'name': self.cattle.name,
-            'tag_number': self.cattle.tag_number,
-            'breed': self.cattle.breed,
-            'age_years': self.cattle.age_years,
-            'milk_yield': self.cattle.daily_milk_yield,
+            'animal_id': cls.cattle.pk,
+            'name': cls.cattle.name,
+            'tag_number': cls.cattle.tag_number,
+            'breed': cls.cattle.breed,
+            'age_years': cls.cattle.age_years,
+            'milk_yield': cls.cattle.daily_milk_yield,
             'issue': 'Low milk yield',
         }
-        self.session = ChatSession.objects.create(user=self.farmer, context=context)
-        ChatMessage.objects.create(session=self.session, role='user', text='Milk production dropped')
-        ChatMessage.objects.create(session=self.session, role='bot', text='Increase protein in ration')
+        cls.session = ChatSession.objects.create(user=cls.farmer, context=context)
+        ChatMessage.objects.create(session=cls.session, role='user', text='Milk production dropped')
+        ChatMessage.objects.create(session=cls.session, role='bot', text='Increase protein in ration')
 
     def test_doctor_can_view_chat_history(self):
         self.client.force_login(self.doctor)
@@ -45,6 +48,7 @@ class DoctorChatHistoryTests(TestCase):
         entry = session_data[0]
         self.assertEqual(entry['farmer'], self.farmer)
         self.assertEqual(entry['context']['name'], self.cattle.name)
+        self.assertEqual(entry['cattle'], self.cattle)
         self.assertEqual(entry['message_count'], 2)
         self.assertEqual(entry['messages'][0].text, 'Milk production dropped')
 
@@ -56,14 +60,14 @@ class DoctorChatHistoryTests(TestCase):
 
 
 class AuthRedirectTests(TestCase):
-    def setUp(self):
+    @classmethod
+    def setUpTestData(cls):
         User = get_user_model()
-        self.farmer = User.objects.create_user(
-            username='farmer_login', password='pass12345', is_farmer=True
-        )
-        self.doctor = User.objects.create_user(
-            username='doctor_login', password='pass12345', is_doctor=True
-        )
+        password = make_password('pass12345')
+        cls.farmer, cls.doctor = User.objects.bulk_create([
+            User(username='farmer_login', password=password, is_farmer=True),
+            User(username='doctor_login', password=password, is_doctor=True),
+        ])
 
     def test_login_redirects_farmers_to_home(self):
         response = self.client.post(reverse('login'), {
@@ -156,3 +160,91 @@ class ManageCattleTests(TestCase):
         })
         self.assertRedirects(response, reverse('manage_cattle'))
         self.assertFalse(Cattle.objects.filter(pk=cattle.pk).exists())
+
+
+class BulkInventoryUpdateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.farmer = get_user_model().objects.create_user(
+            username='farmer_stock', password='pass123', is_farmer=True
+        )
+        cls.feed = InventoryItem.objects.create(user=cls.farmer, item_name='Feed', quantity=10, reorder_level=2)
+        cls.salt = InventoryItem.objects.create(user=cls.farmer, item_name='Salt', quantity=5, reorder_level=1)
+
+    def _post(self, rows):
+        data = {'form-TOTAL_FORMS': str(len(rows)), 'form-INITIAL_FORMS': str(len(rows))}
+        for index, (item, action, quantity) in enumerate(rows):
+            data.update({
+                f'form-{index}-item_id': str(item.pk),
+                f'form-{index}-action': action,
+                f'form-{index}-quantity': quantity,
+                f'form-{index}-notes': '',
+            })
+        self.client.force_login(self.farmer)
+        return self.client.post(reverse('bulk_update_inventory'), data)
+
+    def test_updates_several_items_and_logs_history(self):
+        response = self._post([(self.feed, 'ADD', '2.5'), (self.salt, 'CONSUME', '1'), (self.salt, 'ADD', '')])
+        self.assertRedirects(response, reverse('inventory'))
+        self.assertEqual(
+            dict(InventoryItem.objects.values_list('item_name', 'quantity')),
+            {'Feed': 12.5, 'Salt': 4.0},
+        )
+        self.assertEqual(InventoryHistory.objects.count(), 2)
+
+    def test_overdrawn_row_rejects_whole_submission(self):
+        response = self._post([(self.feed, 'ADD', '2'), (self.salt, 'CONSUME', '50')])
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Not enough stock')
+        self.assertEqual(InventoryItem.objects.get(pk=self.feed.pk).quantity, 10)
+        self.assertFalse(InventoryHistory.objects.exists())
+
+
+class DoctorListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.farmer = User.objects.create_user(username='farmer_list', password='pass123', is_farmer=True)
+        cls.doctor = User.objects.create_user(username='doc_list', password='pass123', is_doctor=True)
+        Message.objects.create(sender=cls.doctor, recipient=cls.farmer, body='Check the calf')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.farmer)
+
+    def test_new_doctor_appears_despite_cached_roster(self):
+        self.client.get(reverse('doctor_list'))
+        get_user_model().objects.create_user(username='doc_new', password='pass123', is_doctor=True)
+        response = self.client.get(reverse('doctor_list'))
+        self.assertEqual([doc['username'] for doc in response.context['doctors']], ['doc_list', 'doc_new'])
+
+    def test_unread_count_is_per_conversation(self):
+        doctors = self.client.get(reverse('doctor_list')).context['doctors']
+        self.assertEqual([doc['unread'] for doc in doctors], [1])
+        other = get_user_model().objects.create_user(username='farmer_other', password='pass123', is_farmer=True)
+        self.client.force_login(other)
+        doctors = self.client.get(reverse('doctor_list')).context['doctors']
+        self.assertEqual([doc['unread'] for doc in doctors], [0])
+
+
+class ChatWindowTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.farmer = User.objects.create_user(username='farmer_chat', password='pass123', is_farmer=True)
+        cls.doctor = User.objects.create_user(username='doc_chat', password='pass123', is_doctor=True)
+        Message.objects.bulk_create(
+            Message(sender=cls.farmer, recipient=cls.doctor, body=f'message {index}') for index in range(120)
+        )
+
+    def test_shows_newest_window_and_pages_back(self):
+        self.client.force_login(self.farmer)
+        url = reverse('chat_view', args=[self.doctor.pk])
+        response = self.client.get(url)
+        bodies = [message.body for message in response.context['messages']]
+        self.assertEqual((len(bodies), bodies[0], bodies[-1]), (100, 'message 20', 'message 119'))
+
+        response = self.client.get(url, {'before': response.context['older_cursor']})
+        bodies = [message.body for message in response.context['messages']]
+        self.assertEqual((len(bodies), bodies[0], bodies[-1]), (20, 'message 0', 'message 19'))
+        self.assertIsNone(response.context['older_cursor'])
@@ -14,6 +14,7 @@ urlpatterns = [
     path('dashboard/farmer/cattle/', views.manage_cattle, name='manage_cattle'),
     path('dashboard/farmer/performance/', views.performance, name='performance'),
     path('dashboard/farmer/inventory/', views.inventory, name='inventory'),
+    path('dashboard/farmer/inventory/bulk-update/', views.bulk_update_inventory, name='bulk_update_inventory'),
     path('dashboard/inventory/update/<int:pk>/', views.update_inventory, name='update_inventory'),
     path('connect/doctors/', views.doctor_list, name='doctor_list'),
     path('connect/inbox/', views.inbox, name='inbox'),
@@ -1,16 +1,20 @@
 # core/views.py
 from datetime import datetime
-from typing import Dict, Tuple
+from functools import lru_cache
 
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, authenticate
 from django.contrib.auth.decorators import login_required
-from django.db.models import Prefetch, Sum
+from django.core.paginator import Paginator
+from django.http import Http404
+from django.db import transaction
+from django.db.models import BigIntegerField, Case, Count, F, Max, Prefetch, Q, Sum, When, prefetch_related_objects
+from django.utils import timezone
 
 from chatbot.models import ChatSession, ChatMessage
 
 from .forms import SignUpForm, LoginForm, CattleForm, FinancialForm
-from .forms import InventoryItemForm, StockUpdateForm
+from .forms import InventoryItemForm, StockUpdateForm, BulkStockUpdateFormSet
 from .models import Cattle, FinancialRecord, InventoryItem, InventoryHistory
 
 
@@ -48,65 +52,92 @@ def doctor_dashboard(request):
     return render(request, 'core/doctor_dashboard.html')
 
 
+_SUMMARY_FIELDS = (
+    ('Breed: {}', 'breed'),
+    ('Yield: {} L/day', 'milk_yield'),
+    ('Age: {} years', 'age_years'),
+    ('Issue: {}', 'issue'),
+)
+
+
 def _summarize_cattle_context(context):
     if not context:
         return "No cattle details recorded"
-    parts = []
     name = context.get('name')
     tag = context.get('tag_number')
     if name and tag:
-        parts.append(f"{name} (Tag {tag})")
+        parts = [f"{name} (Tag {tag})"]
     elif name:
-        parts.append(str(name))
+        parts = [str(name)]
     elif tag:
-        parts.append(f"Tag {tag}")
-    if context.get('breed'):
-        parts.append(f"Breed: {context['breed']}")
-    if context.get('milk_yield'):
-        parts.append(f"Yield: {context['milk_yield']} L/day")
-    if context.get('age_years'):
-        parts.append(f"Age: {context['age_years']} years")
-    if context.get('issue'):
-        parts.append(f"Issue: {context['issue']}")
-    if not parts:
-        return "No cattle details recorded"
-    return " | ".join(parts)
+        parts = [f"Tag {tag}"]
+    else:
+        parts = []
+    parts += [template.format(value) for template, key in _SUMMARY_FIELDS if (value := context.get(key))]
+    return " | ".join(parts) or "No cattle details recorded"
+
+
+def _with_unit(unit):
+    def format_value(value):
+        return f"{value} {unit}" if isinstance(value, (int, float)) else value
+    return format_value
+
+
+@lru_cache(maxsize=512)
+def _format_date_string(value):
+    # Cached per distinct string: sessions for the same herd tend to repeat vaccination dates.
+    try:
+        return datetime.fromisoformat(value).strftime('%b %d, %Y')
+    except ValueError:
+        return value
+
+
+def _format_vaccination_date(value):
+    return _format_date_string(str(value))
+
+
+_CTX_LABELS = (
+    ('Name', 'name'),
+    ('Tag #', 'tag_number'),
+    ('Breed', 'breed'),
+    ('Age (years)', 'age_years'),
+    ('Milk yield (L/day)', 'milk_yield'),
+    ('Lactation stage', 'lactation_stage'),
+    ('Primary issue', 'issue'),
+    ('Notes', 'notes'),
+    ('Last vaccination', 'last_vaccination_date'),
+    ('Under treatment', 'is_sick'),
+)
+
+_CTX_FORMATTERS = {
+    'age_years': _with_unit('years'),
+    'milk_yield': _with_unit('L/day'),
+    'last_vaccination_date': _format_vaccination_date,
+    'is_sick': lambda value: 'Yes' if value else 'No',
+}
 
 
 def _context_items(context):
-    labels = [
-        ('Name', 'name'),
-        ('Tag #', 'tag_number'),
-        ('Breed', 'breed'),
-        ('Age (years)', 'age_years'),
-        ('Milk yield (L/day)', 'milk_yield'),
-        ('Lactation stage', 'lactation_stage'),
-        ('Primary issue', 'issue'),
-        ('Notes', 'notes'),
-        ('Last vaccination', 'last_vaccination_date'),
-        ('Under treatment', 'is_sick'),
-    ]
     items = []
-    for label, key in labels:
+    for label, key in _CTX_LABELS:
         value = context.get(key)
         if value in (None, '', []):
             continue
-        display = value
-        if key == 'age_years' and isinstance(value, (int, float)):
-            display = f"{value} years"
-        elif key == 'milk_yield' and isinstance(value, (int, float)):
-            display = f"{value} L/day"
-        elif key == 'last_vaccination_date':
-            try:
-                display = datetime.fromisoformat(str(value)).strftime('%b %d, %Y')
-            except ValueError:
-                display = str(value)
-        elif key == 'is_sick':
-            display = 'Yes' if bool(value) else 'No'
-        items.append((label, display))
+        formatter = _CTX_FORMATTERS.get(key)
+        items.append((label, formatter(value) if formatter else value))
     return items
 
 
+def _context_animal_pk(context):
+    animal_id = context.get('animal_id')
+    if animal_id in (None, ''):
+        return None
+    try:
+        return int(animal_id) or None
+    except (TypeError, ValueError):
+        return None
+
+
 @login_required
 def doctor_chat_history(request):
     if not getattr(request.user, 'is_doctor', False):
@@ -114,63 +145,47 @@ def doctor_chat_history(request):
 
     message_prefetch = Prefetch(
         'messages',
-        queryset=ChatMessage.objects.order_by('created_at'),
+        queryset=ChatMessage.objects.only('id', 'session_id', 'role', 'text', 'created_at').order_by('created_at'),
         to_attr='ordered_messages',
     )
 
     sessions = (
         ChatSession.objects.select_related('user')
+        .only('id', 'created_at', 'context', 'user__id', 'user__username', 'user__first_name', 'user__last_name')
         .filter(user__is_farmer=True)
         .prefetch_related(message_prefetch)
-        .order_by('-created_at')
+        .order_by('-created_at', '-id')
     )
 
-    cattle_lookup: Dict[Tuple[int, int], Cattle] = {}
-    candidate_pairs = set()
-    for session in sessions:
-        context = session.context or {}
-        animal_id = context.get('animal_id')
-        if animal_id in (None, ''):
-            continue
-        try:
-            animal_pk = int(animal_id)
-        except (TypeError, ValueError):
-            continue
-        owner_pk = getattr(session.user, 'pk', None)
-        if owner_pk is None:
-            continue
-        candidate_pairs.add((owner_pk, animal_pk))
-
-    if candidate_pairs:
-        owner_ids = {owner_id for owner_id, _ in candidate_pairs}
-        cattle_ids = {animal_pk for _, animal_pk in candidate_pairs}
-        cattle_queryset = (
-            Cattle.objects.filter(owner_id__in=owner_ids, pk__in=cattle_ids)
-            .select_related('owner')
+    # A page of sessions at a time bounds how many sessions, messages and cattle are prefetched
+    page = Paginator(sessions, 25).get_page(request.GET.get('page'))
+    page_sessions = list(page)
+
+    # Only the animals the page's contexts point at are loaded, and none at all when no context names one
+    animal_pks = {pk for pk in (_context_animal_pk(session.context or {}) for session in page_sessions) if pk}
+    if animal_pks:
+        prefetch_related_objects(
+            [session.user for session in page_sessions],
+            Prefetch('cattle_set', queryset=Cattle.objects.filter(pk__in=animal_pks), to_attr='prefetched_cattle'),
         )
-        for cattle in cattle_queryset:
-            owner_pk = getattr(cattle.owner, 'pk', None)
-            if owner_pk is None:
-                continue
-            cattle_lookup[(owner_pk, cattle.pk)] = cattle
 
     session_data = []
-    for session in sessions:
+    cattle_by_owner = {}
+    for session in page_sessions:
         context = session.context or {}
-        messages = list(getattr(session, 'ordered_messages', []))
+        messages = session.ordered_messages
         last_message_at = messages[-1].created_at if messages else session.created_at
 
         cattle_obj = None
-        animal_id = context.get('animal_id')
-        if animal_id not in (None, ''):
-            try:
-                animal_pk = int(animal_id)
-            except (TypeError, ValueError):
-                animal_pk = None
-            if animal_pk:
-                owner_pk = getattr(session.user, 'pk', None)
-                if owner_pk is not None:
-                    cattle_obj = cattle_lookup.get((owner_pk, animal_pk))
+        animal_pk = _context_animal_pk(context)
+        if animal_pk:
+            # Index each farmer's herd once, however many of their sessions are on the page
+            owner_cattle = cattle_by_owner.get(session.user_id)
+            if owner_cattle is None:
+                owner_cattle = cattle_by_owner[session.user_id] = {
+                    cattle.pk: cattle for cattle in session.user.prefetched_cattle
+                }
+            cattle_obj = owner_cattle.get(animal_pk)
 
         session_data.append({
             'session': session,
@@ -187,6 +202,7 @@ def doctor_chat_history(request):
 
     return render(request, 'core/doctor_chat_history.html', {
         'session_data': session_data,
+        'page': page,
     })
 
 
@@ -196,8 +212,9 @@ def manage_cattle(request):
 
     if request.method == 'POST':
         if 'delete_id' in request.POST:
-            cattle = get_object_or_404(Cattle, pk=request.POST.get('delete_id'), owner=request.user)
-            cattle.delete()
+            deleted, _ = Cattle.objects.filter(pk=request.POST.get('delete_id'), owner=request.user).delete()
+            if not deleted:
+                raise Http404('No Cattle matches the given query.')
             return redirect('manage_cattle')
 
         cattle_id = request.POST.get('cattle_id')
@@ -236,16 +253,31 @@ def performance(request):
             return redirect('performance')
     else:
         form = FinancialForm()
-    records = FinancialRecord.objects.filter(user=request.user).order_by('-date')
-    total_income = records.filter(type='income').aggregate(Sum('amount'))['amount__sum'] or 0
-    total_expense = records.filter(type='expense').aggregate(Sum('amount'))['amount__sum'] or 0
+    records = FinancialRecord.objects.filter(user=request.user).order_by('-date', '-id')
+    totals = records.aggregate(
+        income=Sum('amount', filter=Q(type='income')),
+        expense=Sum('amount', filter=Q(type='expense')),
+    )
+    total_income = totals['income'] or 0
+    total_expense = totals['expense'] or 0
     net_profit = total_income - total_expense
+    # Totals cover every record; only the table is paged.
+    page = Paginator(records, 50).get_page(request.GET.get('page'))
     return render(request, 'core/performance.html', {
-        'records': records, 'form': form,
+        'page': page, 'form': form,
         'total_income': total_income, 'total_expense': total_expense, 'net_profit': net_profit
     })
 
 
+def _log_history(entries):
+    """Write a batch of InventoryHistory rows with as few INSERTs as possible"""
+    InventoryHistory.objects.bulk_create(entries, batch_size=1000)
+
+
+def _bulk_stock_formset(items, data=None):
+    return BulkStockUpdateFormSet(data, initial=[{'item_id': item.pk, 'item_name': item.item_name} for item in items])
+
+
 @login_required
 def inventory(request):
     """View current stock, days remaining, and add new items"""
@@ -256,21 +288,72 @@ def inventory(request):
             item.user = request.user
             item.save()
             # Create initial history log
-            InventoryHistory.objects.create(
-                item=item, action='ADD', quantity_changed=item.quantity, notes="Initial Stock"
-            )
+            _log_history([
+                InventoryHistory(item=item, action='ADD', quantity_changed=item.quantity, notes="Initial Stock")
+            ])
             return redirect('inventory')
     else:
         form = InventoryItemForm()
         
     items = InventoryItem.objects.filter(user=request.user)
-    return render(request, 'core/inventory.html', {'items': items, 'form': form})
+    return render(request, 'core/inventory.html', {
+        'items': items, 'form': form, 'bulk_formset': _bulk_stock_formset(items),
+    })
+
+@login_required
+def bulk_update_inventory(request):
+    """Add or consume stock for several items at once, logging every change in one batch"""
+    if request.method != 'POST':
+        return redirect('inventory')
+
+    items = InventoryItem.objects.filter(user=request.user)
+    formset = _bulk_stock_formset(items, request.POST)
+    if formset.is_valid():
+        with transaction.atomic():
+            rows = [row for row in formset if row.cleaned_data.get('quantity')]
+            locked = InventoryItem.objects.select_for_update().filter(user=request.user).in_bulk(
+                [row.cleaned_data['item_id'] for row in rows]
+            )
+            changed, entries = {}, []
+            for row in rows:
+                action = row.cleaned_data['action']
+                qty = row.cleaned_data['quantity']
+                item = locked.get(row.cleaned_data['item_id'])
+                if item is None:
+                    row.add_error(None, 'This item is no longer in your inventory.')
+                    continue
+                if action == 'ADD':
+                    item.quantity += qty
+                elif item.quantity >= qty:
+                    item.quantity -= qty
+                else:
+                    row.add_error('quantity', 'Not enough stock to consume this amount!')
+                    continue
+                changed[item.pk] = item
+                entries.append(InventoryHistory(item=item, action=action, quantity_changed=qty, notes=row.cleaned_data['notes']))
+
+            if not any(row.errors for row in rows):
+                # bulk_update bypasses save(), so auto_now has to be applied by hand
+                now = timezone.now()
+                for item in changed.values():
+                    item.last_updated = now
+                InventoryItem.objects.bulk_update(changed.values(), ['quantity', 'last_updated'])
+                _log_history(entries)
+                return redirect('inventory')
+
+    return render(request, 'core/inventory.html', {
+        'items': items, 'form': InventoryItemForm(), 'bulk_formset': formset,
+    })
+
+def _render_stock_update(request, form, item):
+    # The history table is only needed when the page is drawn, never on the redirect after a save
+    history = item.history.order_by('-date')[:10]
+    return render(request, 'core/update_inventory.html', {'form': form, 'item': item, 'history': history})
 
 @login_required
 def update_inventory(request, pk):
     """Handle Adding or Consuming stock with History"""
     item = get_object_or_404(InventoryItem, pk=pk, user=request.user)
-    history = InventoryHistory.objects.filter(item=item).order_by('-date')[:10]
 
     if request.method == 'POST':
         form = StockUpdateForm(request.POST)
@@ -279,49 +362,86 @@ def update_inventory(request, pk):
             qty = form.cleaned_data['quantity']
             notes = form.cleaned_data['notes']
 
-            # Update the main item quantity
-            if action == 'ADD':
-                item.quantity += qty
-            elif action == 'CONSUME':
-                if item.quantity >= qty:
-                    item.quantity -= qty
+            # Update the main item quantity in the database itself, so concurrent updates cannot
+            # overwrite each other and a consume only succeeds while enough stock remains
+            with transaction.atomic():
+                stock = InventoryItem.objects.filter(pk=item.pk, user=request.user)
+                if action == 'CONSUME':
+                    stock = stock.filter(quantity__gte=qty)
+                    change = F('quantity') - qty
                 else:
-                    form.add_error('quantity', 'Not enough stock to consume this amount!')
-                    return render(request, 'core/update_inventory.html', {'form': form, 'item': item, 'history': history})
-
-            item.save()
-
-            # Create History Record
-            InventoryHistory.objects.create(
-                item=item, action=action, quantity_changed=qty, notes=notes
-            )
+                    change = F('quantity') + qty
+                updated = stock.update(quantity=change, last_updated=timezone.now())
+
+                # Create History Record
+                if updated:
+                    _log_history([
+                        InventoryHistory(item=item, action=action, quantity_changed=qty, notes=notes)
+                    ])
+
+            if not updated:
+                form.add_error('quantity', 'Not enough stock to consume this amount!')
+                return _render_stock_update(request, form, item)
             return redirect('inventory')
     else:
         form = StockUpdateForm()
 
-    return render(request, 'core/update_inventory.html', {'form': form, 'item': item, 'history': history})
+    return _render_stock_update(request, form, item)
 
 # --- Append to core/views.py ---
 from .models import Message, User
 from .forms import MessageForm
-from django.db.models import Q
+from .signals import DOCTOR_ROSTER_CACHE_KEY
+from django.core.cache import cache
+
+# CACHES is not configured, so the roster lives in each worker's local-memory cache and the
+# signal in signals.py only clears the copy in the worker that saved the doctor. The timeout
+# bounds how long the other workers can show a stale list.
+DOCTOR_ROSTER_TIMEOUT = 60
+CHAT_WINDOW_SIZE = 100
+
+
+def _message_partners(user):
+    """The user's sent and received messages, each annotated with the other party's id"""
+    return (
+        Message.objects.filter(Q(sender=user) | Q(recipient=user))
+        .annotate(other_id=Case(
+            When(sender_id=user.pk, then=F('recipient_id')),
+            default=F('sender_id'),
+            output_field=BigIntegerField(),
+        ))
+        .order_by()
+    )
+
+
+def _load_doctor_roster():
+    return list(
+        User.objects.filter(is_doctor=True).order_by('pk')
+        .values('id', 'username', specialization=F('doctorprofile__specialization'))
+    )
+
 
 @login_required
 def doctor_list(request):
     """List all registered doctors for the farmer to contact"""
-    doctors = User.objects.filter(is_doctor=True)
+    # The roster is shared by every farmer and rarely changes; signals.py drops it when a doctor changes
+    roster = cache.get_or_set(DOCTOR_ROSTER_CACHE_KEY, _load_doctor_roster, DOCTOR_ROSTER_TIMEOUT)
+
+    # Latest message in my conversation with each contact, and how many of theirs I have not read yet
+    activity = {
+        row.pop('other_id'): row
+        for row in _message_partners(request.user).values('other_id').annotate(
+            last_msg=Max('timestamp'),
+            unread=Count('pk', filter=Q(recipient=request.user, is_read=False)),
+        )
+    }
+    doctors = [{'last_msg': None, 'unread': 0, **doc, **activity.get(doc['id'], {})} for doc in roster]
     return render(request, 'core/doctor_list.html', {'doctors': doctors})
 
 @login_required
 def chat_view(request, user_id):
     """Chat room between current user and another user (user_id)"""
     other_user = get_object_or_404(User, pk=user_id)
-    
-    # Fetch conversation history
-    messages = Message.objects.filter(
-        (Q(sender=request.user) & Q(recipient=other_user)) |
-        (Q(sender=other_user) & Q(recipient=request.user))
-    ).order_by('timestamp')
 
     if request.method == 'POST':
         form = MessageForm(request.POST, request.FILES)
@@ -334,20 +454,31 @@ def chat_view(request, user_id):
     else:
         form = MessageForm()
 
+    # Fetch the newest window of the conversation; ?before=<message id> steps back to older messages
+    conversation = Message.objects.filter(
+        (Q(sender=request.user) & Q(recipient=other_user)) |
+        (Q(sender=other_user) & Q(recipient=request.user))
+    )
+    before = request.GET.get('before', '')
+    if before.isdigit():
+        conversation = conversation.filter(pk__lt=int(before))
+    window = list(conversation.select_related('sender').order_by('-pk')[:CHAT_WINDOW_SIZE + 1])
+    older_cursor = window[CHAT_WINDOW_SIZE - 1].pk if len(window) > CHAT_WINDOW_SIZE else None
+    messages = window[:CHAT_WINDOW_SIZE][::-1]
+
     return render(request, 'core/chat.html', {
         'other_user': other_user, 
         'messages': messages, 
+        'older_cursor': older_cursor,
         'form': form
     })
 
 @login_required
 def inbox(request):
     """List of people who have exchanged messages with the current user"""
-    # Get all unique users involved in messages with me
-    sent_to = Message.objects.filter(sender=request.user).values_list('recipient', flat=True)
-    received_from = Message.objects.filter(recipient=request.user).values_list('sender', flat=True)
-    
-    contact_ids = set(list(sent_to) + list(received_from))
+    # The other party of every message I sent or received, deduplicated by the database and
+    # inlined as a subquery so the contacts come back in one SELECT
+    contact_ids = _message_partners(request.user).values('other_id').distinct()
     contacts = User.objects.filter(id__in=contact_ids)
     
     return render(request, 'core/inbox.html', {'contacts': contacts})
@@ -16,8 +16,13 @@ CHATBOT_API_URL = os.getenv('CHATBOT_API_URL')  # optional; defaults to Groq cha
 CHATBOT_API_KEY = os.getenv('CHATBOT_API_KEY') or os.getenv('GROQ_API_KEY')
 CHATBOT_MODEL = os.getenv('CHATBOT_MODEL', '')  # optional; defaults to Groq llama-3.1-8b-instant in code
 CHATBOT_EMBED_MODEL = os.getenv('CHATBOT_EMBED_MODEL', 'all-MiniLM-L6-v2')
+CHATBOT_EMBED_ONNX_PATH = os.getenv('CHATBOT_EMBED_ONNX_PATH')  # optional; int8 ONNX export served by onnxruntime
+CHATBOT_EMBED_TOKENIZER = os.getenv('CHATBOT_EMBED_TOKENIZER')  # optional; defaults to sentence-transformers/<CHATBOT_EMBED_MODEL>
+CHATBOT_TORCH_THREADS = int(os.getenv('CHATBOT_TORCH_THREADS', '0'))  # 0 = half the CPU cores
 HUGGINGFACE_API_TOKEN = os.getenv('HUGGINGFACE_API_TOKEN') or os.getenv('SENTENCE_TRANSFORMERS_API_KEY')
 ALLOWED_SIMILARITY = float(os.getenv("ALLOWED_SIMILARITY", 0.65))
+# Load the embedding model when a worker boots instead of on the first chat request.
+CHATBOT_WARM_EMBEDDINGS = os.getenv('CHATBOT_WARM_EMBEDDINGS', 'True').lower() in {'1', 'true', 'yes', 'on'}
 
 
 SECRET_KEY = os.getenv('DJANGO_SECRET_KEY') or os.getenv('SECRET_KEY') or 'django-insecure-^#b5@8n63+t4bf+ddjq)(t#srf)egdam$av0)8hb^bcg=561*+'
@@ -53,7 +58,6 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'core',
     'chatbot',
-    'gaayatri_project',  # <--- CRITICAL: Make sure 'core' is added here
 ]
 
 MIDDLEWARE = [
@@ -96,15 +100,16 @@ DATABASES = {
         conn_health_checks=True,
     )
 }
-default_config = dj_database_url.config(
-    default=default_sqlite_url,
-    conn_max_age=600,
-    conn_health_checks=True,
-)
-DATABASES = {'default': default_config}
-
-if default_config.get('ENGINE') == 'django.db.backends.sqlite3':
-    default_config['NAME'] = str(BASE_DIR / 'db.sqlite3')
+
+if DATABASES['default'].get('ENGINE') == 'django.db.backends.sqlite3':
+    DATABASES['default']['NAME'] = str(BASE_DIR / 'db.sqlite3')
+
+# WAL journaling for SQLite (see core/signals.py). Off by default: the mode is written into the
+# database file, which would modify the committed db.sqlite3 on every command.
+SQLITE_WAL_MODE = os.getenv('SQLITE_WAL_MODE', 'False').lower() in {'1', 'true', 'yes', 'on'}
+
+# Keep the test database between `manage.py test` runs (use --fresh-db to rebuild it)
+TEST_RUNNER = 'gaayatri_project.test_runner.KeepDBTestRunner'
 
 # Password validation (Standard)
 AUTH_PASSWORD_VALIDATORS = [
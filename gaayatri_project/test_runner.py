@@ -0,0 +1,33 @@
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+class KeepDBTestRunner(DiscoverRunner):
+    """Reuse the test database between runs unless --fresh-db is passed."""
+
+    def __init__(self, *args, fresh_db=False, **kwargs):
+        kwargs['keepdb'] = not fresh_db
+        super().__init__(*args, **kwargs)
+
+    @classmethod
+    def add_arguments(cls, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--fresh-db',
+            action='store_true',
+            help='Destroy and rebuild the test database, e.g. after changing an unmigrated model.',
+        )
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        # The manifest storage needs collectstatic output; tests render templates without it.
+        # MD5 keeps create_user/force_login cheap; the default PBKDF2 dominates short tests.
+        self._settings_override = override_settings(
+            STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+            PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+        )
+        self._settings_override.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._settings_override.disable()
+        super().teardown_test_environment(**kwargs)